@@ -0,0 +1,88 @@
+"""
+Benchmark ContentCompressor formats: legacy base64 text, raw bytes, raw bytes with a
+trained preset dictionary, and streaming for large content.
+
+    cd backend && python -m benchmarks.content_compressor
+"""
+import argparse
+import random
+import time
+from typing import Callable, List, Tuple
+
+from pipeline.compressor import ContentCompressor, CompressionDictionary
+from benchmarks.corpus import SUBJECTS, OPENERS, DETAILS
+
+
+def sample_messages(count: int, seed: int = 42) -> List[str]:
+    """Deterministic chat-like messages of realistic length"""
+    rng = random.Random(seed)
+    messages = []
+    for i in range(count):
+        if i % 2 == 0:
+            messages.append(f"How do I fix {rng.choice(SUBJECTS)}? It fails with error code {rng.randint(100, 599)}.")
+        else:
+            details = " ".join(rng.sample(DETAILS, rng.randint(2, 4)))
+            messages.append(f"{rng.choice(OPENERS)} {rng.choice(SUBJECTS)}. {details}")
+    return messages
+
+
+def measure(name: str, items: List[str], compress: Callable, decompress: Callable,
+            size_of: Callable = len) -> Tuple[str, float, float, float]:
+    raw = sum(len(item.encode("utf-8")) for item in items)
+    start = time.perf_counter()
+    packed = [compress(item) for item in items]
+    compress_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    for blob in packed:
+        decompress(blob)
+    decompress_seconds = time.perf_counter() - start
+    stored = sum(size_of(blob) for blob in packed)
+    mb = raw / 1e6
+    return name, raw / stored, mb / compress_seconds, mb / decompress_seconds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--train", type=int, default=2000, help="messages used to train the dictionary")
+    parser.add_argument("--large-mb", type=int, default=16, help="size of the streaming test content")
+    args = parser.parse_args()
+
+    messages = sample_messages(args.messages + args.train)
+    training, corpus = messages[:args.train], messages[args.train:]
+
+    plain = ContentCompressor()
+    trained = ContentCompressor()
+    start = time.perf_counter()
+    dictionary = CompressionDictionary.train(training)
+    train_seconds = time.perf_counter() - start
+    trained.register_dictionary(dictionary)
+
+    rows = [
+        measure("base64 (current)", corpus, plain.compress_content, plain.decompress_content),
+        measure("raw bytes", corpus, plain.compress_bytes, plain.decompress_bytes),
+        measure("raw bytes + dictionary", corpus, trained.compress_bytes, trained.decompress_bytes),
+    ]
+
+    large = "\n".join(corpus) * max(1, args.large_mb * 1_000_000 // max(1, len("\n".join(corpus))))
+    chunk = 1 << 20
+    pieces = [large[i:i + chunk] for i in range(0, len(large), chunk)]
+    start = time.perf_counter()
+    frames = list(plain.compress_stream(pieces))
+    compress_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    restored = sum(len(part) for part in plain.decompress_stream(frames))
+    decompress_seconds = time.perf_counter() - start
+    mb = len(large.encode("utf-8")) / 1e6
+    assert restored == len(large.encode("utf-8"))
+    rows.append(("streaming (large)", mb * 1e6 / sum(len(f) for f in frames), mb / compress_seconds, mb / decompress_seconds))
+
+    print(f"dictionary {dictionary.version_id}: {len(dictionary.data)} bytes, trained in {train_seconds:.2f}s "
+          f"on {len(training)} messages; {len(corpus)} messages measured")
+    print(f"{'format':<26}{'ratio':>8}{'comp MB/s':>12}{'decomp MB/s':>13}")
+    for name, ratio, comp, decomp in rows:
+        print(f"{name:<26}{ratio:>8.2f}{comp:>12.1f}{decomp:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+"""Vocabulary shared by the benchmark corpora so every benchmark sees the same kind of chat text"""
+
+SUBJECTS = ["the API", "this function", "the database", "my React component", "the Docker build",
+            "the migration", "our CI pipeline", "the cache layer", "the auth flow", "this query"]
+OPENERS = ["Sure! Here's how you can fix", "Great question. To debug", "I'd recommend refactoring",
+           "The error happens because of", "Let's walk through", "You can speed up"]
+DETAILS = ["Make sure the environment variables are set correctly.",
+           "Check the logs for the full stack trace.",
+           "This avoids an extra round trip to the server.",
+           "Remember to add an index on the foreign key column.",
+           "Wrap the call in a try/except block and log the error.",
+           "Let me know if you have any other questions!"]
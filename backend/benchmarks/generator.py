@@ -0,0 +1,177 @@
+"""
+Deterministic synthetic exports in the shapes the extractors read: ChatGPT `mapping`
+trees (with regenerated branches), Moonshot and Deepseek `messages` lists and
+Perplexity `history` threads. The same arguments always produce the same bytes.
+
+    cd backend && python -m benchmarks.generator --source chatgpt --conversations 100 > export.json
+"""
+import argparse
+import json
+import random
+import uuid
+from typing import Any, Dict, List, Optional
+
+from models.schemas import ConversationSource
+from benchmarks.corpus import SUBJECTS, OPENERS, DETAILS
+
+
+SOURCES = [ConversationSource.CHATGPT, ConversationSource.MOONSHOT,
+           ConversationSource.DEEPSEEK, ConversationSource.PERPLEXITY]
+
+_EPOCH = 1_700_000_000.0
+
+_PROBLEMS = ["fails with error code {n}", "times out after {n} seconds", "returns {n} duplicate rows",
+             "leaks about {n} MB per hour", "is {n}x slower since the last deploy"]
+_FOLLOW_UPS = ["That worked, thanks. What about {s}?", "Still seeing it. Could it be {s}?",
+               "Can you explain why that helps {s}?", "How would I test {s} after this change?"]
+_CODE = {
+    "python": ["def handler(event):", "    items = load(event[\"id\"])", "    for item in items:",
+               "        process(item)", "    return {\"count\": len(items)}"],
+    "javascript": ["async function fetchUser(id) {", "  const res = await fetch(`/api/users/${id}`);",
+                   "  if (!res.ok) throw new Error(res.statusText);", "  return res.json();", "}"],
+    "sql": ["SELECT c.id, COUNT(m.id) AS messages", "FROM conversations c",
+            "JOIN messages m ON m.conversation_id = c.id", "GROUP BY c.id", "ORDER BY messages DESC;"],
+    "bash": ["set -euo pipefail", "docker build -t app:latest .", "docker run --rm -p 8000:8000 app:latest"],
+}
+
+
+class ExportGenerator:
+    """
+    Builds realistic exports of configurable size. branchiness is the chance that an
+    assistant turn was regenerated (ChatGPT keeps every variant as a sibling node) and
+    code_density the chance that an assistant reply carries a fenced code block.
+    """
+
+    def __init__(self, seed: int = 42, messages_per_conversation: int = 20,
+                 branchiness: float = 0.1, code_density: float = 0.3):
+        self.seed = seed
+        self.messages_per_conversation = messages_per_conversation
+        self.branchiness = branchiness
+        self.code_density = code_density
+
+    def generate(self, source: ConversationSource, conversations: int) -> List[Dict[str, Any]]:
+        """An export of the given source shape; conversation i is identical across sources"""
+        build = {
+            ConversationSource.CHATGPT: self._chatgpt,
+            ConversationSource.MOONSHOT: self._messages_list,
+            ConversationSource.DEEPSEEK: self._messages_list,
+            ConversationSource.PERPLEXITY: self._perplexity,
+        }.get(source)
+        if build is None:
+            raise ValueError(f"No generator for source: {source}")
+        return [build(random.Random(f"{self.seed}:{i}"), i) for i in range(conversations)]
+
+    def write(self, path: str, source: ConversationSource, conversations: int) -> int:
+        """Write an export file and return its size in bytes"""
+        data = json.dumps(self.generate(source, conversations)).encode("utf-8")
+        with open(path, "wb") as f:
+            f.write(data)
+        return len(data)
+
+    def _turns(self, rng: random.Random) -> List[Dict[str, Any]]:
+        """Alternating user/assistant turns; regenerated assistant turns carry extra variants"""
+        subject = rng.choice(SUBJECTS)
+        turns = []
+        for i in range(self.messages_per_conversation):
+            if i % 2 == 0:
+                turns.append({"role": "user", "variants": [self._question(rng, subject, first=i == 0)]})
+                continue
+            reply = self._reply(rng, subject)
+            variants = [reply]
+            while rng.random() < self.branchiness and len(variants) < 4:
+                # Regenerations are near-duplicates: same answer with a detail swapped
+                variants.append(f"{reply} {rng.choice(DETAILS)}")
+            turns.append({"role": "assistant", "variants": variants})
+            subject = rng.choice(SUBJECTS)
+        return turns
+
+    @staticmethod
+    def _question(rng: random.Random, subject: str, first: bool) -> str:
+        if first:
+            problem = rng.choice(_PROBLEMS).format(n=rng.randint(2, 599))
+            return f"How do I fix {subject}? It {problem}."
+        return rng.choice(_FOLLOW_UPS).format(s=subject)
+
+    def _reply(self, rng: random.Random, subject: str) -> str:
+        text = f"{rng.choice(OPENERS)} {subject}. " + " ".join(rng.sample(DETAILS, rng.randint(2, 5)))
+        if rng.random() < self.code_density:
+            language = rng.choice(sorted(_CODE))
+            lines = _CODE[language][:rng.randint(2, len(_CODE[language]))]
+            code = "\n".join(lines)
+            text += f"\n\n```{language}\n{code}\n```\n\n{rng.choice(DETAILS)}"
+        return text
+
+    def _chatgpt(self, rng: random.Random, index: int) -> Dict[str, Any]:
+        created = _EPOCH + index * 3600
+        conversation_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        mapping: Dict[str, Dict[str, Any]] = {}
+
+        def add(parent: Optional[str], message: Optional[Dict[str, Any]]) -> str:
+            node_id = str(uuid.UUID(int=rng.getrandbits(128)))
+            mapping[node_id] = {"id": node_id, "message": message, "parent": parent, "children": []}
+            if parent is not None:
+                mapping[parent]["children"].append(node_id)
+            return node_id
+
+        def message(node_time: float, role: str, text: str) -> Dict[str, Any]:
+            return {
+                "id": str(uuid.UUID(int=rng.getrandbits(128))),
+                "author": {"role": role, "name": None, "metadata": {}},
+                "create_time": node_time,
+                "update_time": None,
+                "content": {"content_type": "text", "parts": [text]},
+                "status": "finished_successfully",
+                "end_turn": role == "assistant",
+                "weight": 1.0,
+                "metadata": {"model_slug": "gpt-4o"} if role == "assistant" else {},
+                "recipient": "all",
+            }
+
+        current = add(None, None)
+        current = add(current, message(created, "system", ""))
+        clock = created
+        for turn in self._turns(rng):
+            clock += rng.uniform(5, 120)
+            # Abandoned regenerations hang off the same parent; the thread continues from the last
+            for text in turn["variants"]:
+                node = add(current, message(clock, turn["role"], text))
+            current = node
+        return {
+            "title": f"Conversation {index}",
+            "create_time": created,
+            "update_time": clock,
+            "mapping": mapping,
+            "moderation_results": [],
+            "current_node": current,
+            "id": conversation_id,
+        }
+
+    def _messages_list(self, rng: random.Random, index: int) -> Dict[str, Any]:
+        return {
+            "title": f"Conversation {index}",
+            "messages": [{"role": turn["role"], "content": turn["variants"][-1]} for turn in self._turns(rng)],
+        }
+
+    def _perplexity(self, rng: random.Random, index: int) -> Dict[str, Any]:
+        return {
+            "title": f"Conversation {index}",
+            "history": [{"role": turn["role"], "text": turn["variants"][-1]} for turn in self._turns(rng)],
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default="chatgpt", choices=[source.value for source in SOURCES])
+    parser.add_argument("--conversations", type=int, default=100)
+    parser.add_argument("--messages", type=int, default=20, help="turns per conversation")
+    parser.add_argument("--branchiness", type=float, default=0.1)
+    parser.add_argument("--code-density", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    generator = ExportGenerator(args.seed, args.messages, args.branchiness, args.code_density)
+    print(json.dumps(generator.generate(ConversationSource(args.source), args.conversations)))
+
+
+if __name__ == "__main__":
+    main()
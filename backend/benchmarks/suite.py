@@ -0,0 +1,268 @@
+"""
+End-to-end performance suite over generated exports: extraction rate per source, ingest
+rate into SQLite (conversation rows plus vector index, as /api/extract does), listing and
+fetch latency, and pipeline throughput. Results can be stored as a baseline and later
+runs checked against it; a metric worse than the baseline by more than the threshold
+fails the run with exit code 1. A check against a baseline recorded with other
+workload parameters is refused with exit code 2.
+
+    cd backend && python -m benchmarks.suite --save-baseline
+    cd backend && python -m benchmarks.suite --check --threshold 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Awaitable, Dict, List, Tuple
+
+from models.schemas import Conversation, CompressionRequest, ConversationSource
+from db.sqlite import DatabaseManager
+from db.vector_index import VectorIndex
+from extractors.chatgpt import ChatGPTExtractor
+from extractors.moonshot import MoonshotExtractor
+from extractors.deepseek import DeepseekExtractor
+from extractors.perplexity import PerplexityExtractor
+from pipeline.compressor import CompressionEngine, estimate_tokens
+from pipeline.segmenter import CodeSegmenter
+from pipeline.dedup import NearDuplicateFilter
+from pipeline.verifier import VerificationLayer
+from pipeline.optimizer import PromptOptimizer
+from benchmarks.generator import ExportGenerator, SOURCES
+
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+EXTRACTORS = {
+    ConversationSource.CHATGPT: ChatGPTExtractor,
+    ConversationSource.MOONSHOT: MoonshotExtractor,
+    ConversationSource.DEEPSEEK: DeepseekExtractor,
+    ConversationSource.PERPLEXITY: PerplexityExtractor,
+}
+
+# Rates regress when they drop, latencies when they rise
+HIGHER_IS_BETTER = ("_per_s",)
+
+
+def higher_is_better(metric: str) -> bool:
+    return metric.endswith(HIGHER_IS_BETTER)
+
+
+def percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def best_of(repeat: int, run: Callable[[], Awaitable[float]]) -> float:
+    """Shortest of several timed runs, the least noisy estimate of the achievable time"""
+    return min([await run() for _ in range(repeat)])
+
+
+async def bench_extraction(generator: ExportGenerator, workdir: str, conversations: int,
+                           repeat: int) -> Tuple[Dict[str, float], List[Conversation]]:
+    metrics: Dict[str, float] = {}
+    extracted: List[Conversation] = []
+    for source in SOURCES:
+        path = os.path.join(workdir, f"{source.value}.json")
+        size = generator.write(path, source, conversations)
+        extractor = EXTRACTORS[source]()
+        result: List[Conversation] = []
+
+        async def run() -> float:
+            nonlocal result
+            start = time.perf_counter()
+            result = await extractor.extract_from_file(path)
+            return time.perf_counter() - start
+
+        seconds = await best_of(repeat, run)
+        if len(result) != conversations:
+            raise RuntimeError(f"{source.value} extractor returned {len(result)} of {conversations} conversations")
+        metrics[f"extract_{source.value}_conversations_per_s"] = conversations / seconds
+        metrics[f"extract_{source.value}_mb_per_s"] = size / 1e6 / seconds
+        extracted.extend(result)
+    return metrics, extracted
+
+
+async def bench_ingest(conversations: List[Conversation], workdir: str,
+                       repeat: int) -> Tuple[Dict[str, float], DatabaseManager]:
+    db_manager = None
+
+    async def run() -> float:
+        nonlocal db_manager
+        # A fresh database per run so every run measures inserts, not overwrites
+        db_path = os.path.join(workdir, f"ingest_{time.perf_counter_ns()}.db")
+        db_manager = DatabaseManager(db_path)
+        vector_index = VectorIndex(db_path)
+        start = time.perf_counter()
+        for conversation in conversations:
+            conversation.id = await db_manager.save_conversation(conversation)
+            await vector_index.add([conversation])
+        return time.perf_counter() - start
+
+    seconds = await best_of(repeat, run)
+    messages = sum(len(conversation.messages) for conversation in conversations)
+    return {
+        "ingest_conversations_per_s": len(conversations) / seconds,
+        "ingest_messages_per_s": messages / seconds,
+    }, db_manager
+
+
+async def bench_reads(db_manager: DatabaseManager, ids: List[str], samples: int,
+                      seed: int) -> Dict[str, float]:
+    rng = random.Random(seed)
+    page = 50
+    pages = max(1, len(ids) - page)
+
+    async def timed(call: Callable[[], Awaitable[Any]]) -> List[float]:
+        latencies = []
+        for _ in range(samples):
+            start = time.perf_counter()
+            await call()
+            latencies.append((time.perf_counter() - start) * 1000)
+        return latencies
+
+    results = {
+        "list": await timed(lambda: db_manager.get_conversations(skip=rng.randrange(pages), limit=page)),
+        "list_summary": await timed(lambda: db_manager.get_conversation_views(
+            ["id", "source", "extracted_at", "metadata"], skip=rng.randrange(pages), limit=page
+        )),
+        "fetch": await timed(lambda: db_manager.get_conversation(rng.choice(ids))),
+        "fetch_last10": await timed(lambda: db_manager.get_conversation_views(
+            ["id", "messages"], conversation_id=rng.choice(ids), last=10
+        )),
+    }
+    metrics: Dict[str, float] = {}
+    for name, latencies in results.items():
+        metrics[f"{name}_p50_ms"] = percentile(latencies, 0.5)
+        metrics[f"{name}_p95_ms"] = percentile(latencies, 0.95)
+    return metrics
+
+
+async def bench_pipeline(conversations: List[Conversation], repeat: int) -> Dict[str, float]:
+    """The CPU stages of run_compression_pipeline, without job bookkeeping or persistence"""
+    request = CompressionRequest()
+    engine = CompressionEngine()
+    segmenter = CodeSegmenter()
+    duplicate_filter = NearDuplicateFilter()
+    verifier = VerificationLayer()
+    optimizer = PromptOptimizer()
+
+    async def run() -> float:
+        start = time.perf_counter()
+        for conversation in conversations:
+            prose, _ = duplicate_filter.deduplicate(conversation, request.near_duplicate_threshold)
+            prose, code_blocks = segmenter.segment(prose)
+            result = await engine.compress(prose, {"compression_ratio": request.compression_ratio})
+            result = segmenter.attach(result, code_blocks)
+            verification = await verifier.verify(result.compressed_content, conversation.messages)
+            await optimizer.optimize(verification.verified_content, verification, {
+                "target_model": request.target_model,
+                "continuation_prompt": request.user_continuation_prompt,
+                "recent_messages": prose.messages[-request.recent_turns:],
+                "original_tokens": result.original_token_count
+            })
+        return time.perf_counter() - start
+
+    seconds = await best_of(repeat, run)
+    tokens = sum(estimate_tokens(message.content) for conversation in conversations
+                 for message in conversation.messages)
+    return {
+        "pipeline_conversations_per_s": len(conversations) / seconds,
+        "pipeline_tokens_per_s": tokens / seconds,
+    }
+
+
+async def run_suite(args: argparse.Namespace) -> Dict[str, float]:
+    generator = ExportGenerator(args.seed, args.messages, args.branchiness, args.code_density)
+    with tempfile.TemporaryDirectory(prefix="bench_") as workdir:
+        metrics, extracted = await bench_extraction(generator, workdir, args.conversations, args.repeat)
+        # The ChatGPT export keeps regenerated branches, so ingest and pipeline see them too
+        chatgpt = [c for c in extracted if c.source == ConversationSource.CHATGPT]
+        ingest, db_manager = await bench_ingest(chatgpt, workdir, args.repeat)
+        metrics.update(ingest)
+        metrics.update(await bench_reads(db_manager, [c.id for c in chatgpt], args.samples, args.seed))
+        metrics.update(await bench_pipeline(chatgpt[:args.pipeline_conversations], args.repeat))
+    return metrics
+
+
+def compare(metrics: Dict[str, float], baseline: Dict[str, float],
+            threshold: float) -> List[Tuple[str, float, float, float, bool]]:
+    """(metric, baseline, current, relative change, regressed) for every metric in both runs"""
+    rows = []
+    for name, value in metrics.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        change = value / base - 1
+        regressed = change < -threshold if higher_is_better(name) else change > threshold
+        rows.append((name, base, value, change, regressed))
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", type=int, default=200, help="conversations per source")
+    parser.add_argument("--messages", type=int, default=20, help="turns per conversation")
+    parser.add_argument("--branchiness", type=float, default=0.1)
+    parser.add_argument("--code-density", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per throughput metric, best kept")
+    parser.add_argument("--samples", type=int, default=200, help="requests per latency metric")
+    parser.add_argument("--pipeline-conversations", type=int, default=50)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--check", action="store_true", help="fail if a metric regressed past the threshold")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args()
+
+    params = {key: getattr(args, key) for key in
+              ("conversations", "messages", "branchiness", "code_density", "seed", "pipeline_conversations")}
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("params") != params:
+            # Numbers from a different workload are not comparable; a check against them is meaningless
+            print(f"baseline was recorded with {baseline.get('params')}, this run uses {params}")
+            if args.check:
+                print("refusing to compare; rerun with the baseline's parameters or --save-baseline")
+                sys.exit(2)
+            baseline = None
+
+    metrics = asyncio.run(run_suite(args))
+
+    rows = compare(metrics, baseline["metrics"], args.threshold) if baseline else []
+    by_name = {row[0]: row for row in rows}
+    print(f"{'metric':<42}{'baseline':>12}{'current':>12}{'change':>9}")
+    for name, value in metrics.items():
+        row = by_name.get(name)
+        if row is None:
+            print(f"{name:<42}{'-':>12}{value:>12.2f}{'':>9}")
+            continue
+        flag = "  REGRESSED" if row[4] else ""
+        print(f"{name:<42}{row[1]:>12.2f}{value:>12.2f}{row[3]:>+9.1%}{flag}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"params": params, "machine": platform.machine(), "python": platform.python_version(),
+                       "metrics": {name: round(value, 4) for name, value in metrics.items()}}, f, indent=2)
+            f.write("\n")
+        print(f"baseline saved to {args.baseline}")
+
+    if args.check:
+        if baseline is None:
+            print(f"no baseline at {args.baseline}; run with --save-baseline first")
+            sys.exit(2)
+        regressions = [row[0] for row in rows if row[4]]
+        if regressions:
+            print(f"{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        print(f"no regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
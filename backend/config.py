@@ -1,25 +1,43 @@
 import os
 from typing import Optional
-from pydantic import BaseSettings, Field
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
 class Settings(BaseSettings):
-    # Security
-    encryption_key: str = Field(..., env="ENCRYPTION_KEY")
-    jwt_secret: str = Field(..., env="JWT_SECRET")
+    # Security (only needed, like the Supabase settings, for per-user API key storage)
+    encryption_key: Optional[str] = Field(None, validation_alias="ENCRYPTION_KEY")
+    encryption_key_version: int = Field(1, validation_alias="ENCRYPTION_KEY_VERSION")
+    # Retired keys still needed for decryption, as "version:secret,version:secret"
+    encryption_previous_keys: str = Field("", validation_alias="ENCRYPTION_PREVIOUS_KEYS")
+    jwt_secret: Optional[str] = Field(None, validation_alias="JWT_SECRET")
     
     # Database
-    supabase_url: str = Field(..., env="SUPABASE_URL")
-    supabase_key: str = Field(..., env="SUPABASE_KEY")
+    supabase_url: Optional[str] = Field(None, validation_alias="SUPABASE_URL")
+    supabase_key: Optional[str] = Field(None, validation_alias="SUPABASE_KEY")
     
     # CORS
-    frontend_url: str = Field("http://localhost:3000", env="FRONTEND_URL")
+    frontend_url: str = Field("http://localhost:3000", validation_alias="FRONTEND_URL")
+    
+    # Rate limiting ("memory" is per process, "sqlite" shares one limit across workers)
+    rate_limit_per_minute: int = Field(60, validation_alias="RATE_LIMIT_PER_MINUTE")
+    rate_limit_backend: str = Field("memory", validation_alias="RATE_LIMIT_BACKEND")
+    rate_limit_db_path: str = Field("rate_limits.db", validation_alias="RATE_LIMIT_DB_PATH")
+    
+    # Security audit log batching
+    audit_batch_size: int = Field(100, validation_alias="AUDIT_BATCH_SIZE")
+    audit_flush_interval: float = Field(2.0, validation_alias="AUDIT_FLUSH_INTERVAL")
+    audit_spill_path: str = Field("security_audit.spill.jsonl", validation_alias="AUDIT_SPILL_PATH")
     
     # API
-    openai_api_key: Optional[str] = Field(None, env="OPENAI_API_KEY")
+    openai_api_key: Optional[str] = Field(None, validation_alias="OPENAI_API_KEY")
+    
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
     
-    class Config:
-        env_file = ".env"
+    @property
+    def supabase_configured(self) -> bool:
+        """True when user API key storage (Supabase, encryption and JWT secrets) is set up"""
+        return all((self.supabase_url, self.supabase_key, self.encryption_key, self.jwt_secret))
 
 
 settings = Settings()
\ No newline at end of file
@@ -0,0 +1,208 @@
+import asyncio
+import glob
+import json
+import os
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any
+
+from config import settings
+from database.supabase_client import SupabaseManager, supabase_manager
+
+
+class AuditLogWriter:
+    """
+    Buffers security audit entries in a bounded queue and inserts them in batches from a
+    background task. Entries that cannot be delivered are appended to a local spill file
+    and replayed on the next successful flush, so every entry is written at least once.
+    """
+
+    def __init__(self, manager: SupabaseManager, batch_size: int = 100, flush_interval: float = 2.0,
+                 max_queue: int = 10000, spill_path: str = "security_audit.spill.jsonl"):
+        self.manager = manager
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.spill_path = spill_path
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: Optional[asyncio.Future] = None
+        # Entries taken off the queue for the batch being assembled
+        self._pending: List[Dict[str, Any]] = []
+
+    def log(self, user_id: str, action: str, service_name: Optional[str] = None,
+            user_agent: Optional[str] = None, ip_address: Optional[str] = None) -> None:
+        """Queue an audit entry without waiting for the backend"""
+        entry = {
+            "user_id": user_id,
+            "action": action,
+            "service_name": service_name,
+            "user_agent": user_agent,
+            "ip_address": ip_address,
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        }
+        if self._queue is None:
+            # Writer not running (e.g. outside the app lifespan): keep the entry for later replay
+            self._spill([entry])
+            return
+        try:
+            self._queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            self._spill([entry])
+
+    def start(self) -> None:
+        """Start the background flush task on the running event loop"""
+        if self._task is None:
+            self._collect_orphaned_replays()
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flush task and deliver (or spill) everything still queued"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"Security audit writer stopped with an error: {str(e)}")
+        self._task = None
+        if self._inflight is not None and not self._inflight.done():
+            try:
+                await self._inflight
+            except Exception as e:
+                print(f"Failed to finish in-flight security audit batch: {str(e)}")
+        remaining = self._pending + self._drain(self._queue.qsize())
+        self._pending = []
+        self._queue = None
+        while remaining:
+            batch, remaining = remaining[:self.batch_size], remaining[self.batch_size:]
+            await self._flush(batch)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            self._pending.append(await self._queue.get())
+            deadline = loop.time() + self.flush_interval
+            while len(self._pending) < self.batch_size:
+                self._pending.extend(self._drain(self.batch_size - len(self._pending)))
+                remaining = deadline - loop.time()
+                if len(self._pending) >= self.batch_size or remaining <= 0:
+                    break
+                try:
+                    self._pending.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            batch, self._pending = self._pending, []
+            # Shielded so a shutdown mid-insert lets stop() wait for the batch instead of losing it
+            self._inflight = asyncio.ensure_future(self._flush(batch))
+            try:
+                await asyncio.shield(self._inflight)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Never let one bad batch end the writer; later entries must still be delivered
+                print(f"Failed to flush security audit batch: {str(e)}")
+
+    def _drain(self, limit: int) -> List[Dict[str, Any]]:
+        entries = []
+        while len(entries) < limit:
+            try:
+                entries.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return entries
+
+    async def _flush(self, batch: List[Dict[str, Any]]) -> None:
+        try:
+            await self.manager.insert_security_audits(batch)
+        except Exception as e:
+            print(f"Failed to flush {len(batch)} security audit entries, spilling to disk: {str(e)}")
+            self._spill(batch)
+            return
+        try:
+            await self._replay_spill()
+        except Exception as e:
+            print(f"Failed to replay security audit spill file: {str(e)}")
+
+    @property
+    def replay_path(self) -> str:
+        # Per process, so workers sharing spill_path never replay or remove each other's claim
+        return f"{self.spill_path}.{os.getpid()}.replay"
+
+    async def _replay_spill(self) -> None:
+        """Re-send spilled entries once the backend accepts writes again"""
+        replay_path = self.replay_path
+        if not os.path.exists(replay_path):
+            # Renaming claims the file for this process, and entries spilled meanwhile go to a fresh one
+            try:
+                os.replace(self.spill_path, replay_path)
+            except OSError:
+                # Nothing spilled, or another worker claimed it first
+                return
+        entries = self._read_entries(replay_path)
+        for start in range(0, len(entries), self.batch_size):
+            try:
+                await self.manager.insert_security_audits(entries[start:start + self.batch_size])
+            except Exception as e:
+                print(f"Failed to replay spilled security audit entries: {str(e)}")
+                self._spill(entries[start:])
+                break
+        self._remove(replay_path)
+
+    def _collect_orphaned_replays(self) -> None:
+        """Move replay files left by crashed processes back into the spill file"""
+        for path in glob.glob(f"{glob.escape(self.spill_path)}.*.replay"):
+            if path == self.replay_path:
+                continue
+            try:
+                entries = self._read_entries(path)
+            except OSError as e:
+                print(f"Failed to read security audit replay file {path}: {str(e)}")
+                continue
+            self._spill(entries)
+            self._remove(path)
+
+    @staticmethod
+    def _read_entries(path: str) -> List[Dict[str, Any]]:
+        entries = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # Blank or torn line (a crash mid-append); the rest of the file is intact
+                    continue
+        return entries
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _spill(self, entries: List[Dict[str, Any]]) -> None:
+        if not entries:
+            return
+        data = "".join(json.dumps(entry) + "\n" for entry in entries).encode("utf-8")
+        try:
+            with open(self.spill_path, "ab+") as f:
+                if f.tell():
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        # Terminate a torn line left by a crash so it cannot swallow these entries
+                        data = b"\n" + data
+                f.write(data)
+        except OSError as e:
+            print(f"Failed to spill security audit entries: {str(e)}")
+
+
+# Global audit log writer instance
+audit_writer = AuditLogWriter(
+    supabase_manager,
+    batch_size=settings.audit_batch_size,
+    flush_interval=settings.audit_flush_interval,
+    spill_path=settings.audit_spill_path
+)
@@ -0,0 +1,99 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any
+
+from database.supabase_client import SupabaseManager, supabase_manager
+
+
+class _UserKeys:
+    __slots__ = ("rows", "expires_at")
+
+    def __init__(self, rows: List[Dict[str, Any]], expires_at: float):
+        self.rows = rows
+        self.expires_at = expires_at
+
+
+class APIKeyCache:
+    """
+    Short-lived per-user cache of user_api_keys rows. Reads go through the cache; writes
+    go through it too, so this process never serves a stale key set.
+    """
+
+    def __init__(self, manager: SupabaseManager, ttl: float = 30.0, max_users: int = 1024):
+        self.manager = manager
+        self.ttl = ttl
+        self.max_users = max_users
+        self.entries: "OrderedDict[str, _UserKeys]" = OrderedDict()
+        # One remote fetch per user at a time; invalidation detaches it so its rows are never stored
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def get_user_keys(self, user_id: str) -> List[Dict[str, Any]]:
+        """All key rows of a user, fetched at most once per TTL"""
+        return (await self._entry(user_id)).rows
+
+    async def get_api_key(self, user_id: str, service_name: str) -> Optional[Dict[str, Any]]:
+        """A user's key row for one service"""
+        for row in await self.get_user_keys(user_id):
+            if row["service_name"] == service_name:
+                return row
+        return None
+
+    def invalidate(self, user_id: str) -> None:
+        self.entries.pop(user_id, None)
+        self._inflight.pop(user_id, None)
+
+    async def upsert_api_key(self, user_id: str, service_name: str, encrypted_key: str,
+                             key_version: int = 1) -> Dict[str, Any]:
+        """Write-through upsert"""
+        try:
+            return await self.manager.upsert_api_key(user_id, service_name, encrypted_key, key_version)
+        finally:
+            self.invalidate(user_id)
+
+    async def bulk_upsert_api_keys(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Write-through bulk upsert, used by key rotation"""
+        try:
+            return await self.manager.bulk_upsert_api_keys(rows)
+        finally:
+            for user_id in {row["user_id"] for row in rows}:
+                self.invalidate(user_id)
+
+    async def delete_api_key(self, user_id: str, service_name: str) -> bool:
+        """Write-through delete"""
+        try:
+            return await self.manager.delete_api_key(user_id, service_name)
+        finally:
+            self.invalidate(user_id)
+
+    async def _entry(self, user_id: str) -> _UserKeys:
+        entry = self.entries.get(user_id)
+        if entry is not None and entry.expires_at > time.monotonic():
+            self.entries.move_to_end(user_id)
+            return entry
+
+        # Concurrent misses for the same user share one remote fetch
+        future = self._inflight.get(user_id)
+        if future is None:
+            future = self._inflight[user_id] = asyncio.ensure_future(self._fetch(user_id))
+        return await asyncio.shield(future)
+
+    async def _fetch(self, user_id: str) -> _UserKeys:
+        current = asyncio.current_task()
+        try:
+            rows = await self.manager.get_user_api_keys(user_id)
+        finally:
+            detached = self._inflight.get(user_id) is not current
+            if not detached:
+                del self._inflight[user_id]
+        entry = _UserKeys(rows, time.monotonic() + self.ttl)
+        if not detached:
+            self.entries[user_id] = entry
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.max_users:
+                self.entries.popitem(last=False)
+        return entry
+
+
+# Global API key cache instance
+api_key_cache = APIKeyCache(supabase_manager)
@@ -1,40 +1,89 @@
-import os
-from supabase import create_client, Client
+import httpx
 from typing import Optional, List, Dict, Any
 
 from config import settings
 
 
 class SupabaseManager:
-    def __init__(self):
-        self.client: Client = create_client(settings.supabase_url, settings.supabase_key)
-    
-    async def get_user_api_keys(self, user_id: str) -> List[Dict[str, Any]]:
+    """Async PostgREST client for the Supabase tables, sharing one pooled connection set per process"""
+
+    def __init__(self, url: Optional[str] = None, key: Optional[str] = None, timeout: float = 5.0,
+                 max_connections: int = 20, transport: Optional[httpx.AsyncBaseTransport] = None):
+        # Settings may be unset when Supabase is not configured; requests then fail rather than the import
+        self.rest_url = f"{(url or settings.supabase_url or '').rstrip('/')}/rest/v1"
+        self.key = key or settings.supabase_key
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created lazily so the pool binds to the running event loop, not the importing one
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.rest_url,
+                headers={
+                    "apikey": self.key,
+                    "Authorization": f"Bearer {self.key}",
+                    "Content-Type": "application/json",
+                },
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+                transport=self.transport
+            )
+        return self._client
+
+    async def close(self) -> None:
+        """Close pooled connections; called on application shutdown"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _request(self, method: str, table: str, params: Optional[Dict[str, str]] = None,
+                       json: Any = None, prefer: Optional[str] = None,
+                       timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        headers = {"Prefer": prefer} if prefer else {}
+        response = await self.client.request(
+            method,
+            f"/{table}",
+            params=params,
+            json=json,
+            headers=headers,
+            timeout=timeout if timeout is not None else self.timeout
+        )
+        response.raise_for_status()
+        if not response.content:
+            return []
+        return response.json()
+
+    async def get_user_api_keys(self, user_id: str, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
         """Get all API keys for a user"""
         try:
-            response = (self.client
-                       .table("user_api_keys")
-                       .select("*")
-                       .eq("user_id", user_id)
-                       .execute())
-            return response.data
+            return await self._request(
+                "GET", "user_api_keys",
+                params={"select": "*", "user_id": f"eq.{user_id}"},
+                timeout=timeout
+            )
         except Exception as e:
             raise Exception(f"Failed to fetch user API keys: {str(e)}")
-    
-    async def get_api_key(self, user_id: str, service_name: str) -> Optional[Dict[str, Any]]:
+
+    async def get_api_key(self, user_id: str, service_name: str,
+                          timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
         """Get a specific API key for a user"""
         try:
-            response = (self.client
-                       .table("user_api_keys")
-                       .select("*")
-                       .eq("user_id", user_id)
-                       .eq("service_name", service_name)
-                       .execute())
-            return response.data[0] if response.data else None
+            rows = await self._request(
+                "GET", "user_api_keys",
+                params={"select": "*", "user_id": f"eq.{user_id}", "service_name": f"eq.{service_name}"},
+                timeout=timeout
+            )
+            return rows[0] if rows else None
         except Exception as e:
             raise Exception(f"Failed to fetch API key: {str(e)}")
-    
-    async def upsert_api_key(self, user_id: str, service_name: str, encrypted_key: str, key_version: int = 1) -> Dict[str, Any]:
+
+    async def upsert_api_key(self, user_id: str, service_name: str, encrypted_key: str, key_version: int = 1,
+                             timeout: Optional[float] = None) -> Dict[str, Any]:
         """Insert or update an API key"""
         try:
             data = {
@@ -43,31 +92,65 @@ class SupabaseManager:
                 "encrypted_key": encrypted_key,
                 "key_version": key_version
             }
-            
-            response = (self.client
-                       .table("user_api_keys")
-                       .upsert(data, on_conflict="user_id,service_name")
-                       .execute())
-            
-            return response.data[0] if response.data else None
+
+            rows = await self._request(
+                "POST", "user_api_keys",
+                params={"on_conflict": "user_id,service_name"},
+                json=data,
+                prefer="resolution=merge-duplicates,return=representation",
+                timeout=timeout
+            )
+
+            return rows[0] if rows else None
         except Exception as e:
             raise Exception(f"Failed to upsert API key: {str(e)}")
-    
-    async def delete_api_key(self, user_id: str, service_name: str) -> bool:
+
+    async def bulk_upsert_api_keys(self, rows: List[Dict[str, Any]],
+                                   timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Insert or update many API keys in a single request"""
+        if not rows:
+            return []
+        try:
+            data = [
+                {
+                    "user_id": row["user_id"],
+                    "service_name": row["service_name"],
+                    "encrypted_key": row["encrypted_key"],
+                    "key_version": row["key_version"]
+                }
+                for row in rows
+            ]
+
+            return await self._request(
+                "POST", "user_api_keys",
+                params={"on_conflict": "user_id,service_name"},
+                json=data,
+                prefer="resolution=merge-duplicates,return=representation",
+                timeout=timeout
+            )
+        except Exception as e:
+            raise Exception(f"Failed to bulk upsert API keys: {str(e)}")
+
+    async def delete_api_key(self, user_id: str, service_name: str, timeout: Optional[float] = None) -> bool:
         """Delete an API key"""
         try:
-            response = (self.client
-                       .table("user_api_keys")
-                       .delete()
-                       .eq("user_id", user_id)
-                       .eq("service_name", service_name)
-                       .execute())
-            
-            return len(response.data) > 0
+            rows = await self._request(
+                "DELETE", "user_api_keys",
+                params={"user_id": f"eq.{user_id}", "service_name": f"eq.{service_name}"},
+                prefer="return=representation",
+                timeout=timeout
+            )
+
+            return len(rows) > 0
         except Exception as e:
             raise Exception(f"Failed to delete API key: {str(e)}")
-    
-    async def log_security_audit(self, user_id: str, action: str, service_name: Optional[str] = None, 
+
+    async def insert_security_audits(self, entries: List[Dict[str, Any]], timeout: Optional[float] = None) -> None:
+        """Insert a batch of audit entries in one request; raises so callers can retry or spill"""
+        if entries:
+            await self._request("POST", "security_audit", json=entries, prefer="return=minimal", timeout=timeout)
+
+    async def log_security_audit(self, user_id: str, action: str, service_name: Optional[str] = None,
                                user_agent: Optional[str] = None, ip_address: Optional[str] = None) -> None:
         """Log security audit entry"""
         try:
@@ -78,15 +161,12 @@ class SupabaseManager:
                 "user_agent": user_agent,
                 "ip_address": ip_address
             }
-            
-            (self.client
-             .table("security_audit")
-             .insert(data)
-             .execute())
+
+            await self._request("POST", "security_audit", json=data, prefer="return=minimal")
         except Exception as e:
             # Don't raise exception for audit failures to avoid breaking main functionality
             print(f"Failed to log security audit: {str(e)}")
 
 
 # Global Supabase manager instance
-supabase_manager = SupabaseManager()
\ No newline at end of file
+supabase_manager = SupabaseManager()
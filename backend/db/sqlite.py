@@ -1,11 +1,94 @@
 import sqlite3
 import aiosqlite
 import json
-from typing import List, Optional, Dict, Any
+import hashlib
+from typing import AsyncIterator, List, Optional, Dict, Any, Tuple
 from datetime import datetime
 import os
 
-from models.schemas import Conversation, Message, ConversationSource, MessageRole
+from monitoring.metrics import timed_query
+from models.schemas import (
+    Conversation, Message, ConversationSource, MessageRole, CompressionCheckpoint,
+    CompressionRequest, PipelineStatus, PipelineStage, PromptOutput
+)
+
+# Conversation fields that can be requested with a projection, mapped to their columns
+CONVERSATION_COLUMNS = {
+    "id": "id",
+    "source": "source",
+    "extracted_at": "extracted_at",
+    "metadata": "metadata",
+    "messages": None,
+}
+
+
+# Key of the all-sources row in conversation_counts
+ALL_SOURCES = "*"
+
+# Per-source and global conversation counts, kept exact by triggers
+CONVERSATION_COUNT_SCHEMA = [
+    """CREATE TABLE conversation_counts (
+        scope TEXT PRIMARY KEY,
+        total INTEGER NOT NULL DEFAULT 0
+    )""",
+    f"""CREATE TRIGGER conversations_count_insert AFTER INSERT ON conversations BEGIN
+        INSERT INTO conversation_counts (scope, total) VALUES (NEW.source, 1), ('{ALL_SOURCES}', 1)
+        ON CONFLICT(scope) DO UPDATE SET total = total + 1;
+    END""",
+    f"""CREATE TRIGGER conversations_count_delete AFTER DELETE ON conversations BEGIN
+        UPDATE conversation_counts SET total = total - 1 WHERE scope IN (OLD.source, '{ALL_SOURCES}');
+    END""",
+    """CREATE TRIGGER conversations_count_update AFTER UPDATE OF source ON conversations
+    WHEN OLD.source != NEW.source BEGIN
+        UPDATE conversation_counts SET total = total - 1 WHERE scope = OLD.source;
+        INSERT INTO conversation_counts (scope, total) VALUES (NEW.source, 1)
+        ON CONFLICT(scope) DO UPDATE SET total = total + 1;
+    END""",
+    f"""INSERT INTO conversation_counts (scope, total)
+        SELECT source, COUNT(*) FROM conversations GROUP BY source
+        UNION ALL SELECT '{ALL_SOURCES}', COUNT(*) FROM conversations""",
+]
+
+
+# Created together with a backfill from the results saved before rollups existed, so
+# analytics cover the whole history; results saved afterwards are folded in as they land
+PIPELINE_ROLLUP_SCHEMA = [
+    """CREATE TABLE pipeline_rollups (
+        day TEXT NOT NULL,
+        source TEXT NOT NULL,
+        model TEXT NOT NULL,
+        runs INTEGER NOT NULL DEFAULT 0,
+        original_tokens INTEGER NOT NULL DEFAULT 0,
+        compressed_tokens INTEGER NOT NULL DEFAULT 0,
+        prompt_tokens INTEGER NOT NULL DEFAULT 0,
+        compression_ratio_sum REAL NOT NULL DEFAULT 0,
+        grounding_score_sum REAL NOT NULL DEFAULT 0,
+        cost_savings REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, source, model)
+    )""",
+    """INSERT INTO pipeline_rollups
+        (day, source, model, runs, original_tokens, compressed_tokens, prompt_tokens,
+         compression_ratio_sum, grounding_score_sum, cost_savings)
+        SELECT day, source, model, COUNT(*), SUM(original_tokens), SUM(compressed_tokens), SUM(prompt_tokens),
+               SUM(compression_ratio), SUM(grounding_score), SUM(savings)
+        FROM (
+            SELECT COALESCE(date(r.created_at), date('now')) AS day,
+                   COALESCE(c.source, 'unknown') AS source,
+                   COALESCE(json_extract(r.metrics, '$.target_model'), 'unknown') AS model,
+                   COALESCE(json_extract(r.metrics, '$.original_tokens'), 0) AS original_tokens,
+                   COALESCE(json_extract(r.metrics, '$.compressed_tokens'), 0) AS compressed_tokens,
+                   COALESCE(json_extract(r.metrics, '$.compression_ratio'), 0) AS compression_ratio,
+                   COALESCE(json_extract(r.metrics, '$.grounding_score'), 0) AS grounding_score,
+                   CASE WHEN json_valid(r.optimized_prompt)
+                        THEN COALESCE(json_extract(r.optimized_prompt, '$.estimated_tokens'), 0) ELSE 0 END AS prompt_tokens,
+                   CASE WHEN json_valid(r.optimized_prompt)
+                        THEN COALESCE(json_extract(r.optimized_prompt, '$.cost_estimation.savings'), 0) ELSE 0 END AS savings
+            FROM pipeline_results r LEFT JOIN conversations c ON c.id = r.conversation_id
+            WHERE json_valid(r.metrics)
+        )
+        GROUP BY day, source, model""",
+]
+
 
 class DatabaseManager:
     def __init__(self, db_path: str = "conversations.db"):
@@ -20,6 +103,7 @@ class DatabaseManager:
             source TEXT NOT NULL,
             extracted_at REAL NOT NULL,
             metadata TEXT,
+            content_hash TEXT,
             created_at DATETIME DEFAULT CURRENT_TIMESTAMP
         );
 
@@ -44,6 +128,45 @@ class DatabaseManager:
             FOREIGN KEY (conversation_id) REFERENCES conversations (id) ON DELETE CASCADE
         );
 
+        CREATE TABLE IF NOT EXISTS compression_checkpoints (
+            conversation_id TEXT PRIMARY KEY,
+            compression_ratio REAL NOT NULL,
+            options_digest TEXT NOT NULL DEFAULT '',
+            summary TEXT NOT NULL,
+            message_count INTEGER NOT NULL,
+            last_message_hash TEXT NOT NULL,
+            original_token_count INTEGER NOT NULL,
+            updated_at REAL NOT NULL,
+            FOREIGN KEY (conversation_id) REFERENCES conversations (id) ON DELETE CASCADE
+        );
+
+        CREATE TABLE IF NOT EXISTS pipeline_batches (
+            id TEXT PRIMARY KEY,
+            total INTEGER NOT NULL,
+            max_concurrency INTEGER NOT NULL,
+            created_at REAL NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS pipeline_jobs (
+            id TEXT PRIMARY KEY,
+            conversation_id TEXT NOT NULL,
+            batch_id TEXT,
+            request TEXT NOT NULL,
+            status TEXT NOT NULL,
+            stage TEXT NOT NULL,
+            progress REAL NOT NULL DEFAULT 0,
+            message TEXT,
+            result TEXT,
+            error TEXT,
+            stage_timings TEXT,
+            worker_id TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            heartbeat_at REAL,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            FOREIGN KEY (batch_id) REFERENCES pipeline_batches (id) ON DELETE CASCADE
+        );
+
         CREATE TABLE IF NOT EXISTS api_keys (
             service TEXT PRIMARY KEY,
             api_key TEXT NOT NULL,
@@ -53,27 +176,79 @@ class DatabaseManager:
         CREATE INDEX IF NOT EXISTS idx_conversations_source ON conversations(source);
         CREATE INDEX IF NOT EXISTS idx_conversations_timestamp ON conversations(extracted_at);
         CREATE INDEX IF NOT EXISTS idx_messages_conversation ON messages(conversation_id);
+        CREATE INDEX IF NOT EXISTS idx_messages_conversation_order ON messages(conversation_id, timestamp, id);
+        CREATE INDEX IF NOT EXISTS idx_pipeline_results_conversation ON pipeline_results(conversation_id, created_at);
+        CREATE INDEX IF NOT EXISTS idx_pipeline_jobs_status ON pipeline_jobs(status, created_at);
+        CREATE INDEX IF NOT EXISTS idx_pipeline_jobs_batch ON pipeline_jobs(batch_id, status);
         """
 
         with sqlite3.connect(self.db_path) as conn:
+            # WAL lets every worker process read while one of them writes
+            conn.execute("PRAGMA journal_mode=WAL")
             conn.executescript(init_script)
+            # Databases created before content hashes existed get the column; hashes are backfilled on read
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(conversations)")}
+            if "content_hash" not in columns:
+                conn.execute("ALTER TABLE conversations ADD COLUMN content_hash TEXT")
+            # Checkpoints from before option digests have an empty one and are never resumed
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(compression_checkpoints)")}
+            if "options_digest" not in columns:
+                conn.execute("ALTER TABLE compression_checkpoints ADD COLUMN options_digest TEXT NOT NULL DEFAULT ''")
             conn.commit()
 
+            # Counters, triggers and the backfill of existing rows are created in one write
+            # transaction so no insert from another worker can be counted twice or missed
+            conn.execute("BEGIN IMMEDIATE")
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'conversation_counts'"
+            ).fetchone()
+            if not exists:
+                for statement in CONVERSATION_COUNT_SCHEMA:
+                    conn.execute(statement)
+            # Same for the rollups: the table only appears once its backfill is in, so it runs once
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'pipeline_rollups'"
+            ).fetchone()
+            if not exists:
+                for statement in PIPELINE_ROLLUP_SCHEMA:
+                    conn.execute(statement)
+            conn.commit()
+
+    @staticmethod
+    def content_hash(conversation: Conversation) -> str:
+        """Hash of everything served for a conversation, used as its ETag"""
+        canonical = json.dumps([
+            conversation.id,
+            conversation.source.value,
+            conversation.extracted_at,
+            conversation.metadata,
+            [[m.role.value, m.content, m.timestamp, m.model] for m in conversation.messages]
+        ], sort_keys=True, default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    @timed_query("save_conversation")
     async def save_conversation(self, conversation: Conversation) -> str:
-        """Save conversation to database and return ID"""
+        """Save conversation to database and return ID (re-extractions replace the stored copy)"""
         async with aiosqlite.connect(self.db_path) as db:
-            # Insert conversation
+            # Insert or refresh conversation
             await db.execute(
-                "INSERT INTO conversations (id, source, extracted_at, metadata) VALUES (?, ?, ?, ?)",
+                """INSERT INTO conversations (id, source, extracted_at, metadata, content_hash) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                    source = excluded.source,
+                    extracted_at = excluded.extracted_at,
+                    metadata = excluded.metadata,
+                    content_hash = excluded.content_hash""",
                 (
                     conversation.id,
                     conversation.source.value,
                     conversation.extracted_at,
-                    json.dumps(conversation.metadata) if conversation.metadata else None
+                    json.dumps(conversation.metadata) if conversation.metadata else None,
+                    self.content_hash(conversation)
                 )
             )
 
-            # Insert messages
+            # Replace messages
+            await db.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation.id,))
             message_data = [
                 (
                     conversation.id,
@@ -93,6 +268,7 @@ class DatabaseManager:
             await db.commit()
             return conversation.id
 
+    @timed_query("get_conversations")
     async def get_conversations(self, skip: int = 0, limit: int = 50) -> List[Conversation]:
         """Get paginated list of conversations"""
         async with aiosqlite.connect(self.db_path) as db:
@@ -111,6 +287,110 @@ class DatabaseManager:
             
             return conversations
 
+    @timed_query("get_conversation_views")
+    async def get_conversation_views(self, fields: List[str], conversation_id: Optional[str] = None,
+                                      skip: int = 0, limit: int = 50, last: Optional[int] = None,
+                                      message_range: Optional[Tuple[int, Optional[int]]] = None) -> List[Dict[str, Any]]:
+        """
+        Get conversations as dicts holding only the requested fields. Only the needed columns
+        are read, and messages are sliced in SQL: the last N, or a [start, end) range by position.
+        """
+        columns = [CONVERSATION_COLUMNS[field] for field in fields if CONVERSATION_COLUMNS.get(field)]
+        if "id" not in columns:
+            columns.insert(0, "id")
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            if conversation_id is not None:
+                cursor = await db.execute(
+                    f"SELECT {', '.join(columns)} FROM conversations WHERE id = ?",
+                    (conversation_id,)
+                )
+            else:
+                cursor = await db.execute(
+                    f"SELECT {', '.join(columns)} FROM conversations ORDER BY extracted_at DESC LIMIT ? OFFSET ?",
+                    (limit, skip)
+                )
+            views: Dict[str, Dict[str, Any]] = {}
+            for row in await cursor.fetchall():
+                view = {field: row[CONVERSATION_COLUMNS[field]] for field in fields if CONVERSATION_COLUMNS.get(field)}
+                if "metadata" in view:
+                    view["metadata"] = json.loads(view["metadata"]) if view["metadata"] else None
+                if "messages" in fields:
+                    view["messages"] = []
+                views[row["id"]] = view
+
+            if "messages" in fields and views:
+                placeholders = ", ".join("?" for _ in views)
+                params: List[Any] = list(views)
+                if last is not None:
+                    order, bounds = "DESC", "position <= ?"
+                    params.append(last)
+                elif message_range is not None:
+                    order, bounds = "ASC", "position > ?"
+                    params.append(message_range[0])
+                    if message_range[1] is not None:
+                        bounds += " AND position <= ?"
+                        params.append(message_range[1])
+                else:
+                    order, bounds = "ASC", "1"
+                # Positions come from the (conversation_id, timestamp, id) index alone; content is
+                # only read for the messages that survive the slice
+                cursor = await db.execute(
+                    f"""SELECT m.conversation_id, m.role, m.content, m.timestamp, m.model
+                    FROM messages m JOIN (
+                        SELECT id FROM (
+                            SELECT id, ROW_NUMBER() OVER (
+                                PARTITION BY conversation_id ORDER BY timestamp {order}, id {order}
+                            ) AS position
+                            FROM messages WHERE conversation_id IN ({placeholders})
+                        ) WHERE {bounds}
+                    ) selected ON m.id = selected.id
+                    ORDER BY m.conversation_id, m.timestamp ASC, m.id ASC""",
+                    params
+                )
+                async for message in cursor:
+                    views[message["conversation_id"]]["messages"].append({
+                        "role": message["role"],
+                        "content": message["content"],
+                        "timestamp": message["timestamp"],
+                        "model": message["model"]
+                    })
+            return list(views.values())
+
+    @timed_query("get_conversation_counts")
+    async def get_conversation_counts(self) -> Dict[str, Any]:
+        """Exact conversation totals, overall and per source, read from the trigger-maintained counters"""
+        async with aiosqlite.connect(self.db_path) as db:
+            cursor = await db.execute("SELECT scope, total FROM conversation_counts")
+            counts = {scope: total for scope, total in await cursor.fetchall()}
+        total = counts.pop(ALL_SOURCES, 0)
+        return {"total": total, "by_source": {scope: n for scope, n in counts.items() if n > 0}}
+
+    @timed_query("get_conversation_ids")
+    async def get_conversation_ids(self, source: Optional[ConversationSource] = None,
+                                   extracted_after: Optional[float] = None,
+                                   extracted_before: Optional[float] = None) -> List[str]:
+        """Get ids of all conversations matching the filter, newest first"""
+        clauses = []
+        params: List[Any] = []
+        if source:
+            clauses.append("source = ?")
+            params.append(source.value)
+        if extracted_after is not None:
+            clauses.append("extracted_at >= ?")
+            params.append(extracted_after)
+        if extracted_before is not None:
+            clauses.append("extracted_at < ?")
+            params.append(extracted_before)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        async with aiosqlite.connect(self.db_path) as db:
+            cursor = await db.execute(
+                f"SELECT id FROM conversations {where} ORDER BY extracted_at DESC",
+                params
+            )
+            return [row[0] for row in await cursor.fetchall()]
+
+    @timed_query("get_conversation")
     async def get_conversation(self, conversation_id: str) -> Optional[Conversation]:
         """Get specific conversation by ID"""
         async with aiosqlite.connect(self.db_path) as db:
@@ -126,6 +406,86 @@ class DatabaseManager:
             
             return await self._build_conversation_from_row(db, row)
 
+    @timed_query("get_conversation_hash")
+    async def get_conversation_hash(self, conversation_id: str) -> Optional[str]:
+        """Stored content hash of a conversation, without loading its messages"""
+        async with aiosqlite.connect(self.db_path) as db:
+            cursor = await db.execute(
+                "SELECT content_hash FROM conversations WHERE id = ?",
+                (conversation_id,)
+            )
+            row = await cursor.fetchone()
+        if not row:
+            return None
+        if row[0]:
+            return row[0]
+
+        # Rows saved before the column existed: hash once and store it
+        conversation = await self.get_conversation(conversation_id)
+        if not conversation:
+            return None
+        content_hash = self.content_hash(conversation)
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute(
+                "UPDATE conversations SET content_hash = ? WHERE id = ?",
+                (content_hash, conversation_id)
+            )
+            await db.commit()
+        return content_hash
+
+    async def iter_export_records(self, after_id: Optional[str] = None,
+                                  source: Optional[ConversationSource] = None,
+                                  include_results: bool = False) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream conversations in id order as plain dicts, one at a time from a DB cursor.
+        after_id resumes an export after the last conversation already received.
+        """
+        clauses = []
+        params: List[Any] = []
+        if after_id is not None:
+            clauses.append("id > ?")
+            params.append(after_id)
+        if source:
+            clauses.append("source = ?")
+            params.append(source.value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute(
+                f"SELECT id, source, extracted_at, metadata FROM conversations {where} ORDER BY id",
+                params
+            ) as conversations:
+                async for row in conversations:
+                    async with db.execute(
+                        "SELECT role, content, timestamp, model FROM messages WHERE conversation_id = ? "
+                        "ORDER BY timestamp ASC, id ASC",
+                        (row["id"],)
+                    ) as messages:
+                        record: Dict[str, Any] = {
+                            "id": row["id"],
+                            "source": row["source"],
+                            "extracted_at": row["extracted_at"],
+                            "messages": [dict(message) async for message in messages],
+                            "metadata": json.loads(row["metadata"]) if row["metadata"] else None
+                        }
+                    if include_results:
+                        cursor = await db.execute(
+                            """SELECT id, compressed_content, verification_result, optimized_prompt, metrics, created_at
+                            FROM pipeline_results WHERE conversation_id = ?
+                            ORDER BY created_at DESC, rowid DESC LIMIT 1""",
+                            (row["id"],)
+                        )
+                        result = await cursor.fetchone()
+                        record["pipeline_result"] = {
+                            "id": result["id"],
+                            "compressed_result": json.loads(result["compressed_content"]),
+                            "verification_result": json.loads(result["verification_result"]),
+                            "optimized_prompt": json.loads(result["optimized_prompt"]),
+                            "metrics": json.loads(result["metrics"]),
+                            "created_at": result["created_at"]
+                        } if result else None
+                    yield record
+
     async def _build_conversation_from_row(self, db: aiosqlite.Connection, row) -> Optional[Conversation]:
         """Build Conversation object from database row"""
         try:
@@ -158,6 +518,7 @@ class DatabaseManager:
             print(f"Error building conversation from row: {e}")
             return None
 
+    @timed_query("delete_conversation")
     async def delete_conversation(self, conversation_id: str) -> bool:
         """Delete conversation and its messages"""
         async with aiosqlite.connect(self.db_path) as db:
@@ -168,9 +529,44 @@ class DatabaseManager:
             await db.commit()
             return cursor.rowcount > 0
 
+    @timed_query("get_compression_checkpoint")
+    async def get_compression_checkpoint(self, conversation_id: str) -> Optional[CompressionCheckpoint]:
+        """Get the latest compression checkpoint for a conversation"""
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            cursor = await db.execute(
+                "SELECT * FROM compression_checkpoints WHERE conversation_id = ?",
+                (conversation_id,)
+            )
+            row = await cursor.fetchone()
+            return CompressionCheckpoint(**dict(row)) if row else None
+
+    @timed_query("save_compression_checkpoint")
+    async def save_compression_checkpoint(self, checkpoint: CompressionCheckpoint) -> None:
+        """Insert or replace the compression checkpoint for a conversation"""
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute(
+                """INSERT OR REPLACE INTO compression_checkpoints
+                (conversation_id, compression_ratio, options_digest, summary, message_count,
+                 last_message_hash, original_token_count, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (
+                    checkpoint.conversation_id,
+                    checkpoint.compression_ratio,
+                    checkpoint.options_digest,
+                    checkpoint.summary,
+                    checkpoint.message_count,
+                    checkpoint.last_message_hash,
+                    checkpoint.original_token_count,
+                    checkpoint.updated_at
+                )
+            )
+            await db.commit()
+
+    @timed_query("save_pipeline_result")
     async def save_pipeline_result(self, pipeline_id: str, conversation_id: str,
                                  compressed_result: Any, verification_result: Any,
-                                 optimized_prompt: Any) -> bool:
+                                 optimized_prompt: Any, extra_metrics: Optional[Dict[str, Any]] = None) -> bool:
         """Save pipeline results to database"""
         try:
             async with aiosqlite.connect(self.db_path) as db:
@@ -180,9 +576,11 @@ class DatabaseManager:
                     "original_tokens": getattr(compressed_result, 'original_token_count', 0),
                     "compressed_tokens": getattr(compressed_result, 'compressed_token_count', 0)
                 }
+                if extra_metrics:
+                    metrics.update(extra_metrics)
                 
                 await db.execute(
-                    """INSERT INTO pipeline_results 
+                    """INSERT OR REPLACE INTO pipeline_results 
                     (id, conversation_id, compressed_content, verification_result, optimized_prompt, metrics)
                     VALUES (?, ?, ?, ?, ?, ?)""",
                     (
@@ -194,8 +592,283 @@ class DatabaseManager:
                         json.dumps(metrics)
                     )
                 )
+                # Fold this run into its (day, source, model) rollup in the same transaction
+                await db.execute(
+                    """INSERT INTO pipeline_rollups
+                    (day, source, model, runs, original_tokens, compressed_tokens, prompt_tokens,
+                     compression_ratio_sum, grounding_score_sum, cost_savings)
+                    VALUES (date('now'), COALESCE((SELECT source FROM conversations WHERE id = ?), 'unknown'),
+                            ?, 1, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(day, source, model) DO UPDATE SET
+                        runs = runs + 1,
+                        original_tokens = original_tokens + excluded.original_tokens,
+                        compressed_tokens = compressed_tokens + excluded.compressed_tokens,
+                        prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+                        compression_ratio_sum = compression_ratio_sum + excluded.compression_ratio_sum,
+                        grounding_score_sum = grounding_score_sum + excluded.grounding_score_sum,
+                        cost_savings = cost_savings + excluded.cost_savings""",
+                    (
+                        conversation_id,
+                        metrics.get("target_model") or "unknown",
+                        metrics["original_tokens"],
+                        metrics["compressed_tokens"],
+                        getattr(optimized_prompt, 'estimated_tokens', 0),
+                        metrics["compression_ratio"],
+                        metrics["grounding_score"],
+                        getattr(optimized_prompt, 'cost_estimation', {}).get("savings", 0.0)
+                    )
+                )
                 await db.commit()
                 return True
         except Exception as e:
             print(f"Error saving pipeline result: {e}")
             return False
+
+    @timed_query("get_pipeline_analytics")
+    async def get_pipeline_analytics(self, group_by: str = "day", since: Optional[str] = None,
+                                     until: Optional[str] = None, source: Optional[str] = None,
+                                     model: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Aggregate pipeline rollups by day, source or model; never touches pipeline_results"""
+        if group_by not in ("day", "source", "model"):
+            raise ValueError(f"Cannot group analytics by {group_by}")
+        clauses = []
+        params: List[Any] = []
+        for column, operator, value in (("day", ">=", since), ("day", "<=", until),
+                                        ("source", "=", source), ("model", "=", model)):
+            if value is not None:
+                clauses.append(f"{column} {operator} ?")
+                params.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            cursor = await db.execute(
+                f"""SELECT {group_by} AS bucket, SUM(runs) AS runs,
+                    SUM(original_tokens) AS original_tokens, SUM(compressed_tokens) AS compressed_tokens,
+                    SUM(prompt_tokens) AS prompt_tokens, SUM(compression_ratio_sum) AS compression_ratio_sum,
+                    SUM(grounding_score_sum) AS grounding_score_sum, SUM(cost_savings) AS cost_savings
+                FROM pipeline_rollups {where} GROUP BY {group_by} ORDER BY {group_by}""",
+                params
+            )
+            return [
+                {
+                    group_by: row["bucket"],
+                    "runs": row["runs"],
+                    "original_tokens": row["original_tokens"],
+                    "compressed_tokens": row["compressed_tokens"],
+                    "prompt_tokens": row["prompt_tokens"],
+                    "avg_compression_ratio": row["compression_ratio_sum"] / row["runs"] if row["runs"] else 0.0,
+                    "avg_grounding_score": row["grounding_score_sum"] / row["runs"] if row["runs"] else 0.0,
+                    "cost_savings": row["cost_savings"]
+                }
+                for row in await cursor.fetchall()
+            ]
+
+    @timed_query("enqueue_jobs")
+    async def enqueue_jobs(self, jobs: List[Dict[str, Any]], batch_id: Optional[str] = None,
+                           max_concurrency: int = 0) -> List[str]:
+        """
+        Queue pipeline jobs (dicts with id, conversation_id and request). A job whose id
+        is already pending or running is left alone; finished ones are reset and re-queued.
+        Returns the ids that were newly queued.
+        """
+        now = datetime.now().timestamp()
+        queued = []
+        async with aiosqlite.connect(self.db_path) as db:
+            if batch_id:
+                await db.execute(
+                    "INSERT INTO pipeline_batches (id, total, max_concurrency, created_at) VALUES (?, ?, ?, ?)",
+                    (batch_id, len(jobs), max_concurrency, now)
+                )
+            for job in jobs:
+                cursor = await db.execute(
+                    """INSERT INTO pipeline_jobs
+                    (id, conversation_id, batch_id, request, status, stage, progress, message, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, 'pending', ?, 0, 'Queued', ?, ?)
+                    ON CONFLICT(id) DO UPDATE SET
+                        batch_id = excluded.batch_id,
+                        request = excluded.request,
+                        status = 'pending',
+                        stage = excluded.stage,
+                        progress = 0,
+                        message = 'Queued',
+                        result = NULL,
+                        error = NULL,
+                        stage_timings = NULL,
+                        worker_id = NULL,
+                        attempts = 0,
+                        created_at = excluded.created_at,
+                        updated_at = excluded.updated_at
+                    WHERE pipeline_jobs.status IN ('completed', 'failed')""",
+                    (
+                        job["id"],
+                        job["conversation_id"],
+                        batch_id,
+                        job["request"].json(),
+                        PipelineStage.INITIALIZING.value,
+                        now,
+                        now
+                    )
+                )
+                if cursor.rowcount:
+                    queued.append(job["id"])
+            await db.commit()
+        return queued
+
+    @timed_query("claim_job")
+    async def claim_job(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """Atomically move the oldest runnable pending job to running for this worker"""
+        now = datetime.now().timestamp()
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            # A single UPDATE ... RETURNING takes the write lock, so two workers never get the same job
+            cursor = await db.execute(
+                """UPDATE pipeline_jobs
+                SET status = 'running', worker_id = ?, attempts = attempts + 1,
+                    heartbeat_at = ?, updated_at = ?
+                WHERE id = (
+                    SELECT j.id FROM pipeline_jobs j
+                    LEFT JOIN pipeline_batches b ON b.id = j.batch_id
+                    WHERE j.status = 'pending'
+                      AND (b.max_concurrency IS NULL OR b.max_concurrency <= 0 OR (
+                          SELECT COUNT(*) FROM pipeline_jobs r
+                          WHERE r.batch_id = j.batch_id AND r.status = 'running'
+                      ) < b.max_concurrency)
+                    ORDER BY j.created_at
+                    LIMIT 1
+                )
+                RETURNING id, conversation_id, batch_id, request, attempts, created_at""",
+                (worker_id, now, now)
+            )
+            row = await cursor.fetchone()
+            await db.commit()
+            if not row:
+                return None
+            job = dict(row)
+            job["request"] = CompressionRequest(**json.loads(job["request"]))
+            return job
+
+    @timed_query("update_job_status")
+    async def update_job_status(self, status: PipelineStatus, worker_id: Optional[str] = None) -> None:
+        """Persist stage/progress of a job; finished stages also finalize the job status"""
+        now = datetime.now().timestamp()
+        if status.stage == PipelineStage.COMPLETED:
+            job_status = "completed"
+        elif status.stage == PipelineStage.FAILED:
+            job_status = "failed"
+        else:
+            job_status = "running"
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute(
+                """UPDATE pipeline_jobs
+                SET status = ?, stage = ?, progress = ?, message = ?, result = ?, error = ?,
+                    stage_timings = ?, heartbeat_at = ?, updated_at = ?
+                WHERE id = ? AND (? IS NULL OR worker_id = ?)""",
+                (
+                    job_status,
+                    status.stage.value,
+                    status.progress,
+                    status.message,
+                    status.result.json() if status.result else None,
+                    status.error,
+                    json.dumps(status.stage_timings),
+                    now,
+                    now,
+                    status.id,
+                    worker_id,
+                    worker_id
+                )
+            )
+            await db.commit()
+
+    @timed_query("heartbeat_jobs")
+    async def heartbeat_jobs(self, worker_id: str) -> None:
+        """Extend the lease of every job this worker is running"""
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute(
+                "UPDATE pipeline_jobs SET heartbeat_at = ? WHERE worker_id = ? AND status = 'running'",
+                (datetime.now().timestamp(), worker_id)
+            )
+            await db.commit()
+
+    @timed_query("release_job")
+    async def release_job(self, job_id: str, worker_id: str) -> None:
+        """Put a running job back in the queue (e.g. on worker shutdown)"""
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute(
+                """UPDATE pipeline_jobs
+                SET status = 'pending', worker_id = NULL, attempts = MAX(attempts - 1, 0),
+                    stage = ?, progress = 0, message = 'Re-queued after worker shutdown', updated_at = ?
+                WHERE id = ? AND worker_id = ? AND status = 'running'""",
+                (PipelineStage.INITIALIZING.value, datetime.now().timestamp(), job_id, worker_id)
+            )
+            await db.commit()
+
+    @timed_query("recover_stale_jobs")
+    async def recover_stale_jobs(self, lease_seconds: float, max_attempts: int) -> int:
+        """Re-queue running jobs whose worker stopped heartbeating; fail them after max_attempts"""
+        now = datetime.now().timestamp()
+        cutoff = now - lease_seconds
+        async with aiosqlite.connect(self.db_path) as db:
+            cursor = await db.execute(
+                """UPDATE pipeline_jobs
+                SET status = 'pending', worker_id = NULL, stage = ?, progress = 0,
+                    message = 'Recovered after worker failure', updated_at = ?
+                WHERE status = 'running' AND heartbeat_at < ? AND attempts < ?""",
+                (PipelineStage.INITIALIZING.value, now, cutoff, max_attempts)
+            )
+            recovered = cursor.rowcount
+            await db.execute(
+                """UPDATE pipeline_jobs
+                SET status = 'failed', stage = ?, message = 'Pipeline failed: worker lost too many times',
+                    error = 'max attempts exceeded', updated_at = ?
+                WHERE status = 'running' AND heartbeat_at < ? AND attempts >= ?""",
+                (PipelineStage.FAILED.value, now, cutoff, max_attempts)
+            )
+            await db.commit()
+            return recovered
+
+    @timed_query("count_pending_jobs")
+    async def count_pending_jobs(self) -> int:
+        """Number of jobs waiting to be claimed"""
+        async with aiosqlite.connect(self.db_path) as db:
+            cursor = await db.execute("SELECT COUNT(*) FROM pipeline_jobs WHERE status = 'pending'")
+            return (await cursor.fetchone())[0]
+
+    @timed_query("get_job_status")
+    async def get_job_status(self, job_id: str) -> Optional[PipelineStatus]:
+        """Get the current status of a pipeline job"""
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            cursor = await db.execute("SELECT * FROM pipeline_jobs WHERE id = ?", (job_id,))
+            row = await cursor.fetchone()
+            return self._status_from_row(row) if row else None
+
+    @timed_query("get_batch_jobs")
+    async def get_batch_jobs(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """Get a batch and the statuses of all of its jobs"""
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            cursor = await db.execute("SELECT * FROM pipeline_batches WHERE id = ?", (batch_id,))
+            batch = await cursor.fetchone()
+            if not batch:
+                return None
+            cursor = await db.execute(
+                "SELECT * FROM pipeline_jobs WHERE batch_id = ? ORDER BY created_at",
+                (batch_id,)
+            )
+            jobs = [self._status_from_row(row) for row in await cursor.fetchall()]
+            return {**dict(batch), "jobs": jobs}
+
+    @staticmethod
+    def _status_from_row(row) -> PipelineStatus:
+        return PipelineStatus(
+            id=row["id"],
+            conversation_id=row["conversation_id"],
+            stage=PipelineStage(row["stage"]),
+            progress=row["progress"],
+            message=row["message"] or "",
+            result=PromptOutput(**json.loads(row["result"])) if row["result"] else None,
+            error=row["error"],
+            stage_timings=json.loads(row["stage_timings"]) if row["stage_timings"] else {},
+            timestamp=row["updated_at"]
+        )
@@ -0,0 +1,254 @@
+import asyncio
+import os
+import re
+import sqlite3
+import zlib
+from typing import Dict, Any, List, Optional, Tuple
+
+import aiosqlite
+import numpy as np
+
+from models.schemas import Conversation
+from pipeline.compressor import estimate_tokens
+from pipeline.executor import cpu_executor
+
+
+_TOKEN = re.compile(r"\w+")
+
+
+class HashingVectorizer:
+    """Signed feature hashing of word unigrams and bigrams into a fixed number of dimensions"""
+
+    def __init__(self, dim: int = 1536):
+        self.dim = dim
+
+    def term_counts(self, texts: List[str]) -> np.ndarray:
+        """Sublinear (1 + log tf) hashed term weights, one float32 row per text"""
+        rows: List[int] = []
+        cols: List[int] = []
+        signs: List[float] = []
+        for row, text in enumerate(texts):
+            words = _TOKEN.findall(text.lower())
+            for term in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                h = zlib.crc32(term.encode("utf-8"))
+                rows.append(row)
+                cols.append(h % self.dim)
+                signs.append(1.0 if h & 0x80000000 else -1.0)
+
+        counts = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(counts, (np.array(rows, dtype=np.intp), np.array(cols, dtype=np.intp)),
+                  np.array(signs, dtype=np.float32))
+        magnitude = np.abs(counts)
+        return np.sign(counts) * np.log1p(magnitude, where=magnitude > 0, out=np.zeros_like(magnitude))
+
+
+class VectorIndex:
+    """
+    Feature-hashed TF-IDF vectors for conversations in a memory-mapped float32 matrix
+    next to the SQLite database. Row assignment and document frequencies live in SQLite
+    so every worker process sees the same index. IDF weights are applied when a vector is
+    written, so older rows use the document frequencies of their time. Vectorizing runs in
+    the CPU process pool and matrix scans in a thread, keeping the event loop free.
+    """
+
+    def __init__(self, db_path: str = "conversations.db", dim: int = 1536, block_rows: int = 65536):
+        self.db_path = db_path
+        self.matrix_path = os.path.splitext(db_path)[0] + ".vectors.f32"
+        self.dim = dim
+        self.block_rows = block_rows
+        self.vectorizer = HashingVectorizer(dim)
+        self._matrix: Optional[np.memmap] = None
+        self._init_tables()
+
+    def _init_tables(self) -> None:
+        with sqlite3.connect(self.db_path) as conn:
+            conn.executescript("""
+            CREATE TABLE IF NOT EXISTS conversation_vectors (
+                conversation_id TEXT PRIMARY KEY,
+                row INTEGER NOT NULL UNIQUE
+            );
+
+            CREATE TABLE IF NOT EXISTS vector_document_frequency (
+                bucket INTEGER PRIMARY KEY,
+                df INTEGER NOT NULL
+            );
+            """)
+            conn.commit()
+
+    def _rows_capacity(self) -> int:
+        if not os.path.exists(self.matrix_path):
+            return 0
+        return os.path.getsize(self.matrix_path) // (self.dim * 4)
+
+    def _open(self, min_rows: int = 0) -> Optional[np.memmap]:
+        """Map the matrix file, growing it (never shrinking) to hold at least min_rows"""
+        capacity = self._rows_capacity()
+        if min_rows > capacity:
+            capacity = max(min_rows, capacity * 2, 1024)
+            with open(self.matrix_path, "ab") as f:
+                f.truncate(capacity * self.dim * 4)
+        if capacity == 0:
+            return None
+        if self._matrix is None or self._matrix.shape[0] != capacity:
+            self._matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        return self._matrix
+
+    @staticmethod
+    def conversation_text(conversation: Conversation) -> str:
+        title = (conversation.metadata or {}).get("title") or ""
+        return "\n".join([title] + [m.content for m in conversation.messages])
+
+    async def add(self, conversations: List[Conversation]) -> None:
+        """Embed and store a batch of conversations (re-adding a conversation overwrites its row)"""
+        if not conversations:
+            return
+        texts = [self.conversation_text(c) for c in conversations]
+        counts = await cpu_executor.run(
+            self.vectorizer.term_counts, texts, tokens=sum(estimate_tokens(text) for text in texts)
+        )
+        loop = asyncio.get_running_loop()
+
+        async with aiosqlite.connect(self.db_path) as db:
+            rows = []
+            replaced = []
+            for conversation in conversations:
+                cursor = await db.execute(
+                    """INSERT INTO conversation_vectors (conversation_id, row)
+                    VALUES (?, (SELECT COALESCE(MAX(row), -1) + 1 FROM conversation_vectors))
+                    ON CONFLICT(conversation_id) DO NOTHING""",
+                    (conversation.id,)
+                )
+                inserted = cursor.rowcount
+                cursor = await db.execute(
+                    "SELECT row FROM conversation_vectors WHERE conversation_id = ?", (conversation.id,)
+                )
+                rows.append((await cursor.fetchone())[0])
+                if not inserted:
+                    replaced.append(rows[-1])
+
+            # Document frequency counts the terms of the stored rows: a re-added conversation
+            # gives back the terms of the row it overwrites
+            bucket_df = (counts != 0).sum(axis=0).astype(np.int64)
+            if replaced:
+                bucket_df -= await loop.run_in_executor(None, self._row_terms, replaced)
+            await self._apply_df(db, bucket_df)
+            idf = await self._idf(db)
+            await db.commit()
+
+        vectors = counts * idf
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms > 0, norms, 1.0)
+        await loop.run_in_executor(None, self._write_rows, rows, vectors)
+
+    def _row_terms(self, rows: List[int]) -> np.ndarray:
+        """Per bucket, how many of the stored rows have a term in it"""
+        matrix = self._open()
+        present = [row for row in rows if matrix is not None and row < matrix.shape[0]]
+        if not present:
+            return np.zeros(self.dim, dtype=np.int64)
+        return (matrix[present] != 0).sum(axis=0).astype(np.int64)
+
+    def _write_rows(self, rows: List[int], vectors: np.ndarray) -> None:
+        matrix = self._open(max(rows) + 1)
+        matrix[rows] = vectors
+        matrix.flush()
+
+    @staticmethod
+    async def _apply_df(db: aiosqlite.Connection, bucket_df: np.ndarray) -> None:
+        changed = np.nonzero(bucket_df)[0]
+        if not len(changed):
+            return
+        await db.executemany(
+            """INSERT INTO vector_document_frequency (bucket, df) VALUES (?, ?)
+            ON CONFLICT(bucket) DO UPDATE SET df = df + excluded.df""",
+            [(int(b), int(bucket_df[b])) for b in changed]
+        )
+        await db.execute("DELETE FROM vector_document_frequency WHERE df <= 0")
+
+    async def remove(self, conversation_id: str) -> None:
+        """Drop a conversation's vector and its terms from the document frequencies"""
+        loop = asyncio.get_running_loop()
+        async with aiosqlite.connect(self.db_path) as db:
+            cursor = await db.execute(
+                "DELETE FROM conversation_vectors WHERE conversation_id = ? RETURNING row", (conversation_id,)
+            )
+            row = await cursor.fetchone()
+            if row:
+                # A stored row is non-zero exactly in the buckets its document counted towards
+                await self._apply_df(db, -await loop.run_in_executor(None, self._row_terms, [row[0]]))
+            await db.commit()
+        if row:
+            await loop.run_in_executor(None, self._clear_row, row[0])
+
+    def _clear_row(self, row: int) -> None:
+        matrix = self._open()
+        if matrix is not None and row < matrix.shape[0]:
+            matrix[row] = 0
+            matrix.flush()
+
+    async def related(self, conversation_id: str, k: int = 10) -> Optional[List[Dict[str, Any]]]:
+        """Top-k most similar conversations to a stored one, or None if it is not indexed"""
+        async with aiosqlite.connect(self.db_path) as db:
+            cursor = await db.execute(
+                "SELECT row FROM conversation_vectors WHERE conversation_id = ?", (conversation_id,)
+            )
+            row = await cursor.fetchone()
+        matrix = self._open()
+        if not row or matrix is None or row[0] >= matrix.shape[0]:
+            return None
+        return await self.search(np.array(matrix[row[0]]), k, exclude_row=row[0])
+
+    async def search_text(self, text: str, k: int = 10) -> List[Dict[str, Any]]:
+        async with aiosqlite.connect(self.db_path) as db:
+            idf = await self._idf(db)
+        counts = await cpu_executor.run(self.vectorizer.term_counts, [text], tokens=estimate_tokens(text))
+        query = counts[0] * idf
+        norm = np.linalg.norm(query)
+        return await self.search(query / norm if norm else query, k)
+
+    async def search(self, query: np.ndarray, k: int = 10, exclude_row: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Cosine top-k via blocked matrix-vector products over the memory-mapped matrix"""
+        async with aiosqlite.connect(self.db_path) as db:
+            cursor = await db.execute("SELECT COALESCE(MAX(row), -1) + 1 FROM conversation_vectors")
+            used_rows = (await cursor.fetchone())[0]
+        if used_rows == 0:
+            return []
+        # NumPy releases the GIL in the matrix products, so a thread keeps the loop responsive
+        best = await asyncio.get_running_loop().run_in_executor(
+            None, self._scan, query, k, exclude_row, used_rows
+        )
+        if not best:
+            return []
+
+        async with aiosqlite.connect(self.db_path) as db:
+            placeholders = ",".join("?" * len(best))
+            cursor = await db.execute(
+                f"SELECT row, conversation_id FROM conversation_vectors WHERE row IN ({placeholders})",
+                [row for _, row in best]
+            )
+            ids = dict(await cursor.fetchall())
+        return [{"conversation_id": ids[row], "score": score} for score, row in best if row in ids]
+
+    def _scan(self, query: np.ndarray, k: int, exclude_row: Optional[int], used_rows: int) -> List[Tuple[float, int]]:
+        matrix = self._open()
+        if matrix is None:
+            return []
+        query = query.astype(np.float32)
+        best: List[Tuple[float, int]] = []
+        for start in range(0, min(used_rows, matrix.shape[0]), self.block_rows):
+            scores = matrix[start:start + self.block_rows] @ query
+            if exclude_row is not None and start <= exclude_row < start + len(scores):
+                scores[exclude_row - start] = -np.inf
+            top = np.argpartition(-scores, min(k, len(scores) - 1))[:k]
+            best.extend((float(scores[i]), start + int(i)) for i in top if scores[i] > 0)
+        return sorted(best, reverse=True)[:k]
+
+    async def _idf(self, db: aiosqlite.Connection) -> np.ndarray:
+        cursor = await db.execute("SELECT COUNT(*) FROM conversation_vectors")
+        documents = (await cursor.fetchone())[0]
+        df = np.zeros(self.dim, dtype=np.float32)
+        cursor = await db.execute("SELECT bucket, df FROM vector_document_frequency")
+        for bucket, count in await cursor.fetchall():
+            if bucket < self.dim:
+                df[bucket] = count
+        return (np.log((1 + documents) / (1 + df)) + 1).astype(np.float32)
@@ -1,46 +1,73 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import asyncio
-from typing import Dict, Any, Optional, cast
+import hashlib
+import json
+import time
+from typing import Dict, Any, List, Optional, Tuple, cast
 import os
+import uuid
+import zlib
 from dotenv import load_dotenv
 
 
 from models.schemas import (
     Conversation, Message, ExtractionRequest, CompressionRequest,
-    PipelineStatus, VerificationResult, PromptOutput, PipelineStage, ConversationSource
+    PipelineStatus, VerificationResult, PromptOutput, PipelineStage, ConversationSource,
+    BatchCompressionRequest, BatchStatus
 )
-from db.sqlite import DatabaseManager
+from db.sqlite import DatabaseManager, CONVERSATION_COLUMNS
+from db.vector_index import VectorIndex
 from extractors.chatgpt import ChatGPTExtractor
 from extractors.claude import ClaudeExtractor
 from extractors.perplexity import PerplexityExtractor
 from extractors.moonshot import MoonshotExtractor
 from extractors.deepseek import DeepseekExtractor
-from pipeline.compressor import CompressionEngine
+from pipeline.compressor import CompressionEngine, estimate_tokens
+from pipeline.deadline import Deadline, StageCostModel
+from pipeline.segmenter import CodeSegmenter
+from pipeline.dedup import NearDuplicateFilter
 from pipeline.verifier import VerificationLayer
 from pipeline.optimizer import PromptOptimizer
+from pipeline.worker import PipelineWorker
+from pipeline.executor import cpu_executor
+from routes.http_cache import conditional_json_response
+from config import settings
+from monitoring.metrics import (
+    registry, stage_timer, REQUEST_LATENCY, PIPELINE_RUNS, ACTIVE_TASKS
+)
 
 
 # Load environment variables
 load_dotenv()
 
-
-# Global state for pipeline tracking
-pipeline_statuses: Dict[str, PipelineStatus] = {}
-active_tasks: Dict[str, asyncio.Task] = {}
+# Per-user API key storage is optional; without Supabase the local compression backend runs alone
+if settings.supabase_configured:
+    from routes.api_keys import router as api_keys_router
+    from database.supabase_client import supabase_manager
+    from database.audit_writer import audit_writer
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     print("Starting Context Crystal Backend...")
+    pipeline_worker.start()
+    if settings.supabase_configured:
+        audit_writer.start()
     yield
-    # Shutdown
+    # Shutdown: running jobs are handed back to the queue for other workers
     print("Shutting down Context Crystal Backend...")
-    for task in active_tasks.values():
-        task.cancel()
-    await asyncio.gather(*active_tasks.values(), return_exceptions=True)
+    await pipeline_worker.stop()
+    cpu_executor.shutdown()
+    if settings.supabase_configured:
+        # Deliver (or spill) buffered audit entries before the HTTP pool closes
+        try:
+            await audit_writer.stop()
+        finally:
+            await supabase_manager.close()
 
 
 app = FastAPI(
@@ -60,15 +87,77 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if settings.supabase_configured:
+    app.include_router(api_keys_router)
+
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        # Label by route template so ids in the path don't explode cardinality
+        route = request.scope.get("route")
+        REQUEST_LATENCY.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status_code
+        )
+
 
 # Initialize database
 db_manager = DatabaseManager()
+vector_index = VectorIndex(db_manager.db_path)
 
 
 # Initialize pipeline components
 compression_engine = CompressionEngine()
+code_segmenter = CodeSegmenter()
+duplicate_filter = NearDuplicateFilter()
 verification_layer = VerificationLayer()
 prompt_optimizer = PromptOptimizer()
+stage_costs = StageCostModel()
+
+# Below this share of its predicted cost, verification is skipped rather than sampled
+MIN_VERIFICATION_SAMPLE = 0.1
+
+
+# Pipeline jobs live in the SQLite job table so any uvicorn worker can run or report them
+async def handle_pipeline_job(job: Dict[str, Any], worker_id: str) -> None:
+    pipeline_status = PipelineStatus(
+        id=job["id"],
+        conversation_id=job["conversation_id"],
+        stage=PipelineStage.INITIALIZING,
+        progress=0,
+        message="Starting compression pipeline..."
+    )
+    conversation = await db_manager.get_conversation(job["conversation_id"])
+    if not conversation:
+        pipeline_status.stage = PipelineStage.FAILED
+        pipeline_status.message = "Conversation not found"
+        await db_manager.update_job_status(pipeline_status, worker_id)
+        return
+    await run_compression_pipeline(pipeline_status, conversation, job["request"], worker_id,
+                                   enqueued_at=job["created_at"])
+
+
+def make_pipeline_id(conversation_id: str, request: CompressionRequest) -> str:
+    """Deterministic pipeline id for a conversation and request parameters"""
+    params = json.dumps(request.dict(), sort_keys=True, default=str)
+    return f"pipeline_{conversation_id}_{hashlib.sha256(params.encode('utf-8')).hexdigest()[:12]}"
+
+
+pipeline_worker = PipelineWorker(
+    db_manager,
+    handle_pipeline_job,
+    concurrency=int(os.getenv("PIPELINE_WORKER_CONCURRENCY", "2"))
+)
+ACTIVE_TASKS.set_function(lambda: len(pipeline_worker.running_jobs))
 
 
 @app.get("/")
@@ -76,6 +165,15 @@ async def root() -> Dict[str, str]:
     return {"message": "Context Crystal Backend API", "status": "running"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> PlainTextResponse:
+    """
+    Prometheus metrics in text exposition format. Counters live in each worker process, so
+    with several workers a scrape returns only the numbers of the worker that answered it.
+    """
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/health")
 async def health_check() -> Dict[str, Any]:
     return {"status": "healthy", "timestamp": asyncio.get_event_loop().time()}
@@ -111,6 +209,7 @@ async def extract_conversation(request: ExtractionRequest) -> Conversation:
 
         conversation_id = await db_manager.save_conversation(conversation)
         conversation.id = conversation_id
+        await vector_index.add([conversation])
         
         return conversation
         
@@ -118,30 +217,128 @@ async def extract_conversation(request: ExtractionRequest) -> Conversation:
         raise HTTPException(status_code=500, detail=f"Extraction failed: {str(e)}")
 
 
+def parse_view_params(fields: Optional[str], last: Optional[int],
+                      message_range: Optional[str]) -> Optional[Tuple[List[str], Optional[int], Optional[Tuple[int, Optional[int]]]]]:
+    """Validate ?fields=, ?last= and ?range=; None means the full conversation was requested"""
+    if fields is None and last is None and message_range is None:
+        return None
+    selected = list(CONVERSATION_COLUMNS)
+    if fields is not None:
+        selected = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = [field for field in selected if field not in CONVERSATION_COLUMNS]
+        if unknown or not selected:
+            raise HTTPException(
+                status_code=400,
+                detail=f"fields must be a comma separated subset of: {', '.join(CONVERSATION_COLUMNS)}"
+            )
+    if last is not None and message_range is not None:
+        raise HTTPException(status_code=400, detail="Use either last or range, not both")
+    if last is not None and last < 0:
+        raise HTTPException(status_code=400, detail="last must be non-negative")
+    bounds = None
+    if message_range is not None:
+        start, sep, end = message_range.partition(":")
+        try:
+            bounds = (int(start or 0), int(end) if end else None)
+        except ValueError:
+            bounds = None
+        if not sep or bounds is None or bounds[0] < 0 or (bounds[1] is not None and bounds[1] < bounds[0]):
+            raise HTTPException(status_code=400, detail="range must be start:end message positions, e.g. 0:20")
+    return selected, last, bounds
+
+
 @app.get("/api/conversations")
-async def get_conversations(skip: int = 0, limit: int = 50) -> Dict[str, Any]:
-    """Get paginated list of conversations"""
+async def get_conversations(skip: int = 0, limit: int = 50, fields: Optional[str] = None,
+                            last: Optional[int] = None,
+                            message_range: Optional[str] = Query(None, alias="range")) -> Dict[str, Any]:
+    """Get paginated list of conversations, optionally projected to some fields and sliced messages"""
+    view = parse_view_params(fields, last, message_range)
     try:
-        conversations = await db_manager.get_conversations(skip, limit)
-        return {"conversations": conversations, "total": len(conversations)}
+        if view:
+            selected, last, bounds = view
+            conversations = await db_manager.get_conversation_views(
+                selected, skip=skip, limit=limit, last=last, message_range=bounds
+            )
+        else:
+            conversations = await db_manager.get_conversations(skip, limit)
+        counts = await db_manager.get_conversation_counts()
+        return {
+            "conversations": conversations,
+            "total": counts["total"],
+            "total_by_source": counts["by_source"],
+            "skip": skip,
+            "limit": limit
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch conversations: {str(e)}")
 
 
-@app.get("/api/conversations/{conversation_id}")
-async def get_conversation(conversation_id: str) -> Conversation:
-    """Get specific conversation by ID"""
+@app.get("/api/conversations/{conversation_id}", response_model=Conversation)
+async def get_conversation(conversation_id: str, request: Request, fields: Optional[str] = None,
+                           last: Optional[int] = None,
+                           message_range: Optional[str] = Query(None, alias="range")) -> Response:
+    """
+    Get specific conversation by ID, revalidated by ETag and compressed when the client accepts it.
+    fields= projects the response; last= or range=start:end slice the messages.
+    """
+    view = parse_view_params(fields, last, message_range)
     try:
-        conversation = await db_manager.get_conversation(conversation_id)
-        if not conversation:
+        content_hash = await db_manager.get_conversation_hash(conversation_id)
+        if not content_hash:
             raise HTTPException(status_code=404, detail="Conversation not found")
-        return conversation
+        
+        async def render() -> Optional[bytes]:
+            if view:
+                selected, last, bounds = view
+                views = await db_manager.get_conversation_views(
+                    selected, conversation_id=conversation_id, last=last, message_range=bounds
+                )
+                return json.dumps(views[0]).encode("utf-8") if views else None
+            conversation = await db_manager.get_conversation(conversation_id)
+            return conversation.json().encode("utf-8") if conversation else None
+        
+        # Each projection is its own representation with its own ETag and cached body
+        variant = hashlib.sha1(repr(view).encode("utf-8")).hexdigest()[:8] if view else ""
+        response = await conditional_json_response(request, content_hash, render, variant)
+        if response is None:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+        return response
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch conversation: {str(e)}")
 
 
+@app.get("/api/conversations/{conversation_id}/related")
+async def get_related_conversations(conversation_id: str, k: int = 10) -> Dict[str, Any]:
+    """Find the conversations most similar to this one"""
+    try:
+        related = await vector_index.related(conversation_id, max(1, min(k, 100)))
+        if related is None:
+            raise HTTPException(status_code=404, detail="Conversation not indexed")
+        return {"conversation_id": conversation_id, "related": related}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to find related conversations: {str(e)}")
+
+
+@app.post("/api/vectors/rebuild")
+async def rebuild_vector_index(batch_size: int = 256) -> Dict[str, Any]:
+    """(Re)embed every stored conversation in batches"""
+    try:
+        indexed = 0
+        while True:
+            batch = await db_manager.get_conversations(indexed, batch_size)
+            if not batch:
+                break
+            await vector_index.add(batch)
+            indexed += len(batch)
+        return {"indexed": indexed}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to rebuild vector index: {str(e)}")
+
+
 @app.post("/api/conversations/{conversation_id}/compress")
 async def start_compression(conversation_id: str, request: CompressionRequest) -> Dict[str, str]:
     """Start compression pipeline for a conversation"""
@@ -150,21 +347,20 @@ async def start_compression(conversation_id: str, request: CompressionRequest) -
         if not conversation:
             raise HTTPException(status_code=404, detail="Conversation not found")
         
-        # Create pipeline status
-        pipeline_id = f"pipeline_{conversation_id}"
-        pipeline_status = PipelineStatus(
-            id=pipeline_id,
-            conversation_id=conversation_id,
-            stage=PipelineStage.INITIALIZING,
-            progress=0,
-            message="Starting compression pipeline..."
-        )
-        pipeline_statuses[pipeline_id] = pipeline_status
-        
-        # Start async pipeline task
-        task = asyncio.create_task(run_compression_pipeline(pipeline_id, conversation, request))
-        active_tasks[pipeline_id] = task
+        # Queue the pipeline job; whichever worker claims it first runs it.
+        # Identical in-flight requests map to the same id and share the running job.
+        pipeline_id = make_pipeline_id(conversation_id, request)
+        queued = await db_manager.enqueue_jobs([
+            {"id": pipeline_id, "conversation_id": conversation_id, "request": request}
+        ])
+        pipeline_worker.notify()
         
+        if not queued:
+            return {
+                "pipeline_id": pipeline_id,
+                "status": "coalesced",
+                "message": "Identical compression pipeline already in progress"
+            }
         return {
             "pipeline_id": pipeline_id,
             "status": "started",
@@ -178,12 +374,149 @@ async def start_compression(conversation_id: str, request: CompressionRequest) -
 
 
 @app.get("/api/pipeline/status/{pipeline_id}")
-async def get_pipeline_status(pipeline_id: str) -> PipelineStatus:
-    """Get current status of a pipeline"""
-    if pipeline_id not in pipeline_statuses:
-        raise HTTPException(status_code=404, detail="Pipeline not found")
+async def get_pipeline_status(pipeline_id: str, wait: float = 0) -> PipelineStatus:
+    """Get current status of a pipeline, optionally long-polling up to `wait` seconds for it to finish"""
+    deadline = time.monotonic() + min(max(wait, 0), 60)
+    delay = 0.1
+    while True:
+        pipeline_status = await db_manager.get_job_status(pipeline_id)
+        if not pipeline_status:
+            raise HTTPException(status_code=404, detail="Pipeline not found")
+        if pipeline_status.stage in (PipelineStage.COMPLETED, PipelineStage.FAILED):
+            return pipeline_status
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return pipeline_status
+        await asyncio.sleep(min(delay, remaining))
+        delay = min(delay * 2, 1.0)
+
+
+@app.post("/api/pipeline/batch")
+async def start_batch_compression(batch_request: BatchCompressionRequest) -> Dict[str, Any]:
+    """Start one job group compressing many conversations with a shared request"""
+    try:
+        if batch_request.conversation_ids is not None:
+            conversation_ids = list(dict.fromkeys(batch_request.conversation_ids))
+        else:
+            conversation_ids = await db_manager.get_conversation_ids(
+                batch_request.source,
+                batch_request.extracted_after,
+                batch_request.extracted_before
+            )
+        if not conversation_ids:
+            raise HTTPException(status_code=404, detail="No conversations matched the batch")
+        
+        batch_id = f"batch_{uuid.uuid4().hex[:12]}"
+        await db_manager.enqueue_jobs(
+            [
+                {"id": f"{batch_id}_{cid}", "conversation_id": cid, "request": batch_request.request}
+                for cid in conversation_ids
+            ],
+            batch_id=batch_id,
+            max_concurrency=batch_request.max_concurrency
+        )
+        pipeline_worker.notify()
+        
+        return {
+            "batch_id": batch_id,
+            "total": len(conversation_ids),
+            "status": "started",
+            "message": "Batch compression started successfully"
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to start batch compression: {str(e)}")
+
+
+@app.get("/api/pipeline/batch/{batch_id}")
+async def get_batch_status(batch_id: str) -> BatchStatus:
+    """Get aggregate progress and per-item results of a batch"""
+    batch = await db_manager.get_batch_jobs(batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
     
-    return pipeline_statuses[pipeline_id]
+    items: List[PipelineStatus] = batch["jobs"]
+    completed = sum(1 for item in items if item.stage == PipelineStage.COMPLETED)
+    failed = sum(1 for item in items if item.stage == PipelineStage.FAILED)
+    if completed + failed == batch["total"]:
+        stage = PipelineStage.COMPLETED if completed else PipelineStage.FAILED
+    elif any(item.progress > 0 for item in items):
+        stage = PipelineStage.COMPRESSION
+    else:
+        stage = PipelineStage.INITIALIZING
+    
+    return BatchStatus(
+        id=batch_id,
+        stage=stage,
+        total=batch["total"],
+        completed=completed,
+        failed=failed,
+        progress=sum(item.progress for item in items) / batch["total"] if batch["total"] else 100,
+        pipeline_ids={item.conversation_id: item.id for item in items},
+        items=items,
+        timestamp=batch["created_at"]
+    )
+
+
+@app.get("/api/analytics")
+async def get_analytics(group_by: str = "day", since: Optional[str] = None, until: Optional[str] = None,
+                        source: Optional[ConversationSource] = None, model: Optional[str] = None) -> Dict[str, Any]:
+    """Aggregate compression savings from the pipeline rollups; since/until are YYYY-MM-DD days"""
+    if group_by not in ("day", "source", "model"):
+        raise HTTPException(status_code=400, detail="group_by must be day, source or model")
+    try:
+        buckets = await db_manager.get_pipeline_analytics(
+            group_by, since, until, source.value if source else None, model
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch analytics: {str(e)}")
+    
+    runs = sum(bucket["runs"] for bucket in buckets)
+    totals = {
+        key: sum(bucket[key] for bucket in buckets)
+        for key in ("runs", "original_tokens", "compressed_tokens", "prompt_tokens", "cost_savings")
+    }
+    totals["avg_compression_ratio"] = sum(b["avg_compression_ratio"] * b["runs"] for b in buckets) / runs if runs else 0.0
+    totals["avg_grounding_score"] = sum(b["avg_grounding_score"] * b["runs"] for b in buckets) / runs if runs else 0.0
+    return {"group_by": group_by, "buckets": buckets, "totals": totals}
+
+
+@app.get("/api/export")
+async def export_conversations(format: str = "ndjson", include_results: bool = False,
+                               cursor: Optional[str] = None,
+                               source: Optional[ConversationSource] = None) -> StreamingResponse:
+    """
+    Stream every conversation as one JSON object per line, optionally gzip compressed.
+    Conversations are exported in id order; to resume, pass the id of the last line received as cursor.
+    """
+    if format not in ("ndjson", "ndjson.gz"):
+        raise HTTPException(status_code=400, detail="format must be ndjson or ndjson.gz")
+    
+    async def ndjson_lines():
+        async for record in db_manager.iter_export_records(cursor, source, include_results):
+            yield (json.dumps(record) + "\n").encode("utf-8")
+    
+    async def gzip_chunks():
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        count = 0
+        async for line in ndjson_lines():
+            count += 1
+            chunk = compressor.compress(line)
+            # Sync-flush periodically so an interrupted download still decompresses up to that point
+            if count % 100 == 0:
+                chunk += compressor.flush(zlib.Z_SYNC_FLUSH)
+            if chunk:
+                yield chunk
+        yield compressor.flush()
+    
+    filename = f"conversations-export.{format}"
+    return StreamingResponse(
+        gzip_chunks() if format == "ndjson.gz" else ndjson_lines(),
+        media_type="application/gzip" if format == "ndjson.gz" else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 
 @app.delete("/api/conversations/{conversation_id}")
@@ -193,6 +526,7 @@ async def delete_conversation(conversation_id: str) -> Dict[str, str]:
         success = await db_manager.delete_conversation(conversation_id)
         if not success:
             raise HTTPException(status_code=404, detail="Conversation not found")
+        await vector_index.remove(conversation_id)
         return {"message": "Conversation deleted successfully"}
     except HTTPException:
         raise
@@ -200,74 +534,164 @@ async def delete_conversation(conversation_id: str) -> Dict[str, str]:
         raise HTTPException(status_code=500, detail=f"Failed to delete conversation: {str(e)}")
 
 
-async def run_compression_pipeline(pipeline_id: str, conversation: Conversation, request: CompressionRequest) -> None:
-    """Run the complete compression pipeline"""
+async def run_compression_pipeline(pipeline_status: PipelineStatus, conversation: Conversation,
+                                   request: CompressionRequest, worker_id: Optional[str] = None,
+                                   enqueued_at: Optional[float] = None) -> None:
+    """Run the complete compression pipeline, persisting status after every stage"""
+    pipeline_id = pipeline_status.id
+    timings = pipeline_status.stage_timings
+    # Per-stage time budgets counted from when the job was queued; stages predicted to
+    # overrun fall back to cheaper strategies
+    deadline = Deadline(request.deadline_ms, stage_costs, enqueued_at=enqueued_at)
+    if deadline.enabled and deadline.remaining() <= 0:
+        # Spent waiting for a worker: every stage below takes its cheapest path
+        deadline.degrade("queue", "budget_spent", queued_ms=round(deadline.queued * 1000, 1))
+    input_tokens = sum(estimate_tokens(message.content) for message in conversation.messages)
     try:
-        pipeline_status = pipeline_statuses[pipeline_id]
+        pipeline_metrics: Dict[str, Any] = {}
+        
+        with stage_timer("preprocessing", timings):
+            # Pre-stage: collapse regenerated/retried near-duplicate messages
+            prose_conversation = conversation
+            if request.deduplicate_messages and deadline.headroom("preprocessing", input_tokens) < 1.0:
+                deadline.degrade("preprocessing", "skip_dedup")
+            elif request.deduplicate_messages:
+                prose_conversation, dropped = await cpu_executor.run(
+                    duplicate_filter.deduplicate, prose_conversation, request.near_duplicate_threshold,
+                    tokens=input_tokens
+                )
+                pipeline_metrics.update(duplicate_filter.stats(dropped))
+            
+            # Pre-stage: move fenced code out of the prose, deduplicated by hash
+            code_blocks = {}
+            if request.preserve_code_blocks:
+                prose_conversation, code_blocks = code_segmenter.segment(prose_conversation)
+                pipeline_metrics.update(code_segmenter.stats(code_blocks))
+        if request.deduplicate_messages and not deadline.degradations:
+            stage_costs.observe("preprocessing", input_tokens, timings["preprocessing"])
         
         # Stage 1: Compression
         pipeline_status.stage = PipelineStage.COMPRESSION
         pipeline_status.progress = 25
         pipeline_status.message = "Running semantic compression..."
+        await db_manager.update_job_status(pipeline_status, worker_id)
         
-        compressed_result = await compression_engine.compress(
-            conversation,
-            {"compression_ratio": request.compression_ratio}
-        )
+        with stage_timer("compression", timings):
+            # Resume from the last checkpoint so only newly added messages are compressed
+            compression_options = {
+                "compression_ratio": request.compression_ratio,
+                "hierarchical": request.hierarchical,
+                "chunk_size_tokens": request.chunk_size_tokens,
+                "merge_fan_out": request.merge_fan_out,
+                # Not used by the engine, but they shape the prose a checkpoint summarizes
+                "preserve_code_blocks": request.preserve_code_blocks,
+                "deduplicate_messages": request.deduplicate_messages,
+                "near_duplicate_threshold": request.near_duplicate_threshold
+            }
+            checkpoint = await db_manager.get_compression_checkpoint(conversation.id)
+            pending_messages = prose_conversation.messages
+            if checkpoint and compression_engine.can_resume(checkpoint, prose_conversation, compression_options):
+                pending_messages = pending_messages[checkpoint.message_count:]
+            pending_tokens = sum(estimate_tokens(message.content) for message in pending_messages)
+            extractive_only = deadline.headroom("compression", pending_tokens) < 1.0
+            if extractive_only:
+                deadline.degrade("compression", "extractive_only")
+            compressed_result = await compression_engine.compress(
+                prose_conversation,
+                dict(compression_options, extractive_only=extractive_only),
+                checkpoint=checkpoint
+            )
+            # A degraded summary (or one built from degraded prose) must not become the base for later runs
+            new_checkpoint = None if deadline.degradations else compression_engine.build_checkpoint(
+                prose_conversation, compressed_result, compression_options
+            )
+            if new_checkpoint:
+                await db_manager.save_compression_checkpoint(new_checkpoint)
+            compressed_result = code_segmenter.attach(compressed_result, code_blocks)
+        if not extractive_only:
+            stage_costs.observe("compression", pending_tokens, timings["compression"])
+        compressed_result.processing_time = timings["preprocessing"] + timings["compression"]
         
         # Stage 2: Verification
         pipeline_status.stage = PipelineStage.VERIFICATION
         pipeline_status.progress = 50
         pipeline_status.message = "Verifying compressed content..."
+        await db_manager.update_job_status(pipeline_status, worker_id)
         
-        # Handle object access safely (attribute vs dict)
-        compressed_content = getattr(compressed_result, "compressed_content", "") if hasattr(compressed_result, "compressed_content") else compressed_result.get("compressed_content", "")
-
-        verification_result = await verification_layer.verify(
-            compressed_content,
-            conversation.messages
-        )
+        with stage_timer("verification", timings):
+            headroom = deadline.headroom("verification", input_tokens)
+            stop_at = time.perf_counter() + deadline.budget("verification") if deadline.enabled else None
+            if headroom >= MIN_VERIFICATION_SAMPLE:
+                if headroom < 1.0:
+                    deadline.degrade("verification", "sampled", sample_rate=round(headroom, 3))
+                verification_result = await verification_layer.verify(
+                    compressed_result.compressed_content,
+                    conversation.messages,
+                    sample_rate=min(1.0, headroom),
+                    stop_at=stop_at
+                )
+                expected = int(verification_result.total_claims * min(1.0, headroom))
+                if (verification_result.checked_claims or 0) < expected:
+                    deadline.degrade("verification", "truncated", checked_claims=verification_result.checked_claims)
+            else:
+                deadline.degrade("verification", "skipped")
+                verification_result = verification_layer.unverified(compressed_result.compressed_content)
+        if headroom >= 1.0 and verification_result.checked_claims == verification_result.total_claims:
+            stage_costs.observe("verification", input_tokens, timings["verification"])
         
         # Stage 3: Optimization
         pipeline_status.stage = PipelineStage.OPTIMIZATION
         pipeline_status.progress = 75
         pipeline_status.message = "Optimizing prompt structure..."
+        await db_manager.update_job_status(pipeline_status, worker_id)
         
-        # Handle verification result safely
-        verified_content = getattr(verification_result, "verified_content", "") if hasattr(verification_result, "verified_content") else verification_result.get("verified_content", compressed_content)
-
-        optimized_prompt = await prompt_optimizer.optimize(
-            verified_content, # Context
-            verification_result # Pass full result as second arg
-        )
+        with stage_timer("optimization", timings):
+            optimized_prompt = await prompt_optimizer.optimize(
+                verification_result.verified_content, # Context
+                verification_result, # Pass full result as second arg
+                {
+                    "token_budget": request.token_budget,
+                    "target_model": request.target_model,
+                    "segment_weights": request.segment_weights,
+                    "continuation_prompt": request.user_continuation_prompt,
+                    "recent_messages": prose_conversation.messages[-request.recent_turns:] if request.recent_turns else [],
+                    "original_tokens": compressed_result.original_token_count
+                }
+            )
+        
+        # Save result to database
+        if deadline.enabled:
+            pipeline_metrics["deadline"] = deadline.summary()
+        pipeline_metrics["stage_timings"] = dict(timings)
+        pipeline_metrics["target_model"] = request.target_model
+        with stage_timer("persistence", timings):
+            await db_manager.save_pipeline_result(
+                pipeline_id,
+                conversation.id,
+                compressed_result,
+                verification_result,
+                optimized_prompt,
+                extra_metrics=pipeline_metrics
+            )
         
         # Stage 4: Complete
         pipeline_status.stage = PipelineStage.COMPLETED
         pipeline_status.progress = 100
         pipeline_status.message = "Pipeline completed successfully"
-        
-        # Convert optimized_prompt to PromptOutput if it isn't already
-        # For now, assume it matches schema or is adaptable
+        if deadline.degradations:
+            degraded = ", ".join(f"{d['stage']}: {d['strategy']}" for d in deadline.degradations)
+            pipeline_status.message = f"Pipeline completed with degraded stages to meet its deadline ({degraded})"
         pipeline_status.result = optimized_prompt
-        
-        # Save result to database
-        await db_manager.save_pipeline_result(
-            pipeline_id,
-            conversation.id,
-            compressed_result,
-            verification_result,
-            optimized_prompt
-        )
+        await db_manager.update_job_status(pipeline_status, worker_id)
+        PIPELINE_RUNS.inc(outcome="completed")
         
     except Exception as e:
         pipeline_status.stage = PipelineStage.FAILED
         pipeline_status.message = f"Pipeline failed: {str(e)}"
+        pipeline_status.error = str(e)
+        PIPELINE_RUNS.inc(outcome="failed")
         print(f"Pipeline {pipeline_id} failed: {e}")
-        
-    finally:
-        # Clean up task
-        if pipeline_id in active_tasks:
-            del active_tasks[pipeline_id]
+        await db_manager.update_job_status(pipeline_status, worker_id)
 
 
 if __name__ == "__main__":
@@ -48,6 +48,16 @@ class CompressionRequest(BaseModel):
     user_continuation_prompt: Optional[str] = "Please continue from the previous context."
     preserve_code_blocks: bool = True
     preserve_technical_details: bool = True
+    hierarchical: bool = False
+    chunk_size_tokens: int = Field(default=4000, ge=256)
+    merge_fan_out: int = Field(default=4, ge=2, le=32)
+    deduplicate_messages: bool = False
+    near_duplicate_threshold: float = Field(default=0.9, ge=0.7, le=1.0)
+    token_budget: Optional[int] = Field(default=None, ge=256)
+    target_model: str = "gpt-4o"
+    recent_turns: int = Field(default=4, ge=0, le=50)
+    segment_weights: Optional[Dict[str, float]] = None
+    deadline_ms: Optional[int] = Field(default=None, ge=100)
 
 class CompressionResult(BaseModel):
     compressed_content: str
@@ -57,6 +67,24 @@ class CompressionResult(BaseModel):
     extracted_facts: List[Dict[str, Any]]
     processing_time: float
 
+class CodeBlockRef(BaseModel):
+    ref: str
+    language: str = ""
+    code: str
+    occurrences: int = 0
+    message_indices: List[int] = Field(default_factory=list)
+
+class CompressionCheckpoint(BaseModel):
+    conversation_id: str
+    compression_ratio: float
+    # Digest of the options the summary was built under (see pipeline.compressor.options_digest)
+    options_digest: str = ""
+    summary: str
+    message_count: int
+    last_message_hash: str
+    original_token_count: int
+    updated_at: float = Field(default_factory=lambda: datetime.now().timestamp())
+
 class VerificationResult(BaseModel):
     verified_content: str
     total_claims: int
@@ -64,6 +92,15 @@ class VerificationResult(BaseModel):
     grounding_score: float
     corrections: List[Dict[str, Any]]
     failed_verifications: List[Dict[str, Any]]
+    claim_sources: List[Dict[str, Any]] = Field(default_factory=list)
+    checked_claims: Optional[int] = None
+
+class PromptSegment(BaseModel):
+    kind: str
+    text: str
+    tokens: int
+    importance: float
+    order: int
 
 class PromptOutput(BaseModel):
     final_prompt: str
@@ -80,6 +117,26 @@ class PipelineStatus(BaseModel):
     message: str
     result: Optional[PromptOutput] = None
     error: Optional[str] = None
+    stage_timings: Dict[str, float] = Field(default_factory=dict)
+    timestamp: float = Field(default_factory=lambda: datetime.now().timestamp())
+
+class BatchCompressionRequest(BaseModel):
+    conversation_ids: Optional[List[str]] = None
+    source: Optional[ConversationSource] = None
+    extracted_after: Optional[float] = None
+    extracted_before: Optional[float] = None
+    request: CompressionRequest = Field(default_factory=CompressionRequest)
+    max_concurrency: int = Field(default=4, ge=1, le=32)
+
+class BatchStatus(BaseModel):
+    id: str
+    stage: PipelineStage
+    total: int
+    completed: int = 0
+    failed: int = 0
+    progress: float = Field(default=0, ge=0, le=100)
+    pipeline_ids: Dict[str, str] = Field(default_factory=dict)
+    items: List[PipelineStatus] = Field(default_factory=list)
     timestamp: float = Field(default_factory=lambda: datetime.now().timestamp())
 
 class APIKeys(BaseModel):
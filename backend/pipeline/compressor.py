@@ -1,10 +1,121 @@
+import asyncio
 import zlib
 import base64
-from typing import Optional
+import hashlib
+import json
+import os
+import re
+import time
+from collections import Counter
+from typing import Optional, Dict, Any, Iterable, Iterator, List, Tuple, Union
+
+from models.schemas import Conversation, Message, CompressionResult, CompressionCheckpoint
+from pipeline.executor import cpu_executor
+
+
+_SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+|\n+')
+_WORD = re.compile(r"[A-Za-z0-9_]{3,}")
+_DICT_TOKEN = re.compile(r"\s*\S+")
+_STOPWORDS = frozenset({
+    "the", "and", "for", "are", "but", "not", "you", "all", "any", "can", "had", "her", "was",
+    "one", "our", "out", "has", "have", "this", "that", "with", "from", "they", "will", "would",
+    "there", "their", "what", "about", "which", "when", "make", "like", "just", "into", "than",
+    "then", "them", "these", "some", "could", "your", "also", "been", "were", "its", "it's",
+})
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token)"""
+    return (len(text) + 3) // 4
+
+
+# Options that shape the prose a checkpoint summarizes; a checkpoint made under others is not resumed
+CHECKPOINT_OPTIONS = ("compression_ratio", "hierarchical", "chunk_size_tokens", "merge_fan_out",
+                      "preserve_code_blocks", "deduplicate_messages", "near_duplicate_threshold")
+
+
+def options_digest(options: Dict[str, Any]) -> str:
+    """Stable hash of the checkpoint-relevant compression options"""
+    shaping = {key: options.get(key) for key in CHECKPOINT_OPTIONS}
+    return hashlib.sha256(json.dumps(shaping, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def message_fingerprint(message: Message) -> str:
+    """Stable hash of a message used to validate compression checkpoints"""
+    return hashlib.sha256(f"{message.role.value}\x00{message.content}".encode("utf-8")).hexdigest()
+
+
+class CompressionDictionary:
+    """Preset zlib dictionary identified by a content-derived version id"""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.version = hashlib.sha256(data).digest()[:4]
+
+    @property
+    def version_id(self) -> str:
+        return self.version.hex()
+
+    def save(self, directory: str) -> str:
+        """Write the dictionary as <version_id>.zdict and return its path"""
+        path = os.path.join(directory, f"{self.version_id}.zdict")
+        with open(path, "wb") as f:
+            f.write(self.data)
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> "CompressionDictionary":
+        with open(path, "rb") as f:
+            return cls(f.read())
+
+    @classmethod
+    def train(cls, samples: List[str], size: int = 32 * 1024, max_ngram: int = 4) -> "CompressionDictionary":
+        """
+        Build a dictionary from the word n-grams that recur across the most samples.
+        The most valuable strings go last, since deflate reaches recent bytes most cheaply.
+        """
+        document_frequency: Counter = Counter()
+        for sample in samples:
+            tokens = _DICT_TOKEN.findall(sample)
+            grams = set()
+            for n in range(1, max_ngram + 1):
+                grams.update("".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+            document_frequency.update(g for g in grams if len(g) > 3)
+
+        scored = sorted(
+            ((df - 1) * len(gram.encode("utf-8")), gram)
+            for gram, df in document_frequency.items() if df > 1
+        )
+        chosen: List[bytes] = []
+        used = 0
+        for _, gram in reversed(scored):
+            encoded = gram.encode("utf-8")
+            if used + len(encoded) > size:
+                continue
+            chosen.append(encoded)
+            used += len(encoded)
+            if used >= size - 8:
+                break
+        return cls(b"".join(reversed(chosen)))
+
 
 class ContentCompressor:
+    """
+    zlib compression for stored content. compress_content/decompress_content keep the
+    original base64 text format; the *_bytes and *_stream methods produce raw framed
+    bytes for BLOB columns, optionally using a trained preset dictionary.
+    """
+
+    # Frame header: magic, flags, 4-byte dictionary version (zeros when unused)
+    MAGIC = b"\xcc"
+    HEADER_SIZE = 6
+    FLAG_DICTIONARY = 0x01
+
     def __init__(self):
         self.compression_level = 6
+        self.dictionaries: Dict[bytes, CompressionDictionary] = {}
+        self.active_dictionary: Optional[CompressionDictionary] = None
+        self._primed: Dict[Tuple[bytes, int], Any] = {}
     
     def compress_content(self, content: str) -> Optional[str]:
         try:
@@ -20,4 +131,283 @@ class ContentCompressor:
             return zlib.decompress(compressed_data).decode('utf-8')
         except Exception as e:
             print(f"Decompression error: {e}")
-            return None
\ No newline at end of file
+            return None
+
+    def register_dictionary(self, dictionary: CompressionDictionary, activate: bool = True) -> None:
+        """Make a dictionary available for decompression and optionally use it for new data"""
+        self.dictionaries[dictionary.version] = dictionary
+        if activate:
+            self.active_dictionary = dictionary
+
+    def compress_bytes(self, content: str) -> bytes:
+        if not self.active_dictionary:
+            return self._header() + zlib.compress(content.encode('utf-8'), self.compression_level, wbits=-15)
+        compressor = self._compressobj()
+        return self._header() + compressor.compress(content.encode('utf-8')) + compressor.flush()
+
+    def decompress_bytes(self, data: bytes) -> str:
+        decompressor = self._decompressobj(data[:self.HEADER_SIZE])
+        payload = decompressor.decompress(data[self.HEADER_SIZE:]) + decompressor.flush()
+        return payload.decode('utf-8')
+
+    def compress_stream(self, chunks: Iterable[Union[str, bytes]]) -> Iterator[bytes]:
+        """Incrementally compress very large content without holding it in memory"""
+        compressor = self._compressobj()
+        yield self._header()
+        for chunk in chunks:
+            data = compressor.compress(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+    def decompress_stream(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """Incrementally decompress a framed stream produced by compress_stream/compress_bytes"""
+        header = b""
+        decompressor = None
+        for chunk in chunks:
+            if decompressor is None:
+                header += chunk
+                if len(header) < self.HEADER_SIZE:
+                    continue
+                decompressor = self._decompressobj(header[:self.HEADER_SIZE])
+                chunk = header[self.HEADER_SIZE:]
+            data = decompressor.decompress(chunk)
+            if data:
+                yield data
+        if decompressor is None:
+            raise ValueError("Truncated compressed stream")
+        tail = decompressor.flush()
+        if tail:
+            yield tail
+
+    def _header(self) -> bytes:
+        if self.active_dictionary:
+            return self.MAGIC + bytes([self.FLAG_DICTIONARY]) + self.active_dictionary.version
+        return self.MAGIC + bytes([0]) + bytes(4)
+
+    def _compressobj(self):
+        # Raw deflate (negative wbits) skips the zlib header and checksum, which matter for short messages.
+        # Loading a preset dictionary is costly, so copy a compressor that already holds it.
+        dictionary = self.active_dictionary
+        key = (dictionary.version if dictionary else b"", self.compression_level)
+        primed = self._primed.get(key)
+        if primed is None:
+            if dictionary:
+                primed = zlib.compressobj(self.compression_level, zlib.DEFLATED, -15, zdict=dictionary.data)
+            else:
+                primed = zlib.compressobj(self.compression_level, zlib.DEFLATED, -15)
+            self._primed[key] = primed
+        return primed.copy()
+
+    def _decompressobj(self, header: bytes):
+        if len(header) < self.HEADER_SIZE or header[:1] != self.MAGIC:
+            raise ValueError("Not a compressed content frame")
+        if header[1] & self.FLAG_DICTIONARY:
+            dictionary = self.dictionaries.get(header[2:6])
+            if dictionary is None:
+                raise ValueError(f"Unknown compression dictionary: {header[2:6].hex()}")
+            return zlib.decompressobj(-15, zdict=dictionary.data)
+        return zlib.decompressobj(-15)
+
+
+# Extraction helpers are module-level so the CPU executor can run them in worker processes
+
+def _compress_blocks(blocks: List[Tuple[str, str]], ratio: float) -> Tuple[str, int]:
+    """Compress (label, text) blocks to (1 - ratio) of their estimated tokens"""
+    total_tokens = sum(estimate_tokens(text) for _, text in blocks)
+    return _extract(blocks, max(1, round(total_tokens * (1 - ratio)))), total_tokens
+
+
+def _merge_summaries(summaries: List[str], scale: float) -> str:
+    """Concatenate partial summaries, re-compressing them when over their share of the budget"""
+    joined = "\n".join(summaries)
+    if scale >= 1.0:
+        return joined
+    blocks = []
+    for line in joined.splitlines():
+        label, sep, text = line.partition(": ")
+        blocks.append((label, text) if sep else ("", line))
+    return _extract(blocks, max(1, round(estimate_tokens(joined) * scale)))
+
+
+def _extract(blocks: List[Tuple[str, str]], budget: int) -> str:
+    """Keep the highest scoring sentences within the token budget, in original order"""
+    units: List[Tuple[int, int, str, int]] = []
+    frequencies: Counter = Counter()
+    for block_index, (_, text) in enumerate(blocks):
+        sentences = [s.strip() for s in _SENTENCE_SPLIT.split(text) if s.strip()]
+        for sent_index, sentence in enumerate(sentences):
+            units.append((block_index, sent_index, sentence, estimate_tokens(sentence)))
+            frequencies.update(_terms(sentence))
+
+    if not units:
+        return ""
+
+    def score(unit: Tuple[int, int, str, int]) -> float:
+        terms = set(_terms(unit[2]))
+        lead_bonus = 1.5 if unit[1] == 0 else 1.0
+        return lead_bonus * sum(frequencies[t] for t in terms) / (1 + len(terms)) ** 0.5
+
+    ranked = sorted(range(len(units)), key=lambda i: score(units[i]), reverse=True)
+    return _render(blocks, units, _select(units, ranked, budget))
+
+
+def _lead_extract(blocks: List[Tuple[str, str]], budget: int) -> str:
+    """Keep the leading sentences of every block within the token budget, in original order"""
+    units: List[Tuple[int, int, str, int]] = []
+    for block_index, (_, text) in enumerate(blocks):
+        sentences = [s.strip() for s in _SENTENCE_SPLIT.split(text) if s.strip()]
+        for sent_index, sentence in enumerate(sentences):
+            units.append((block_index, sent_index, sentence, estimate_tokens(sentence)))
+    ranked = sorted(range(len(units)), key=lambda i: (units[i][1], units[i][0]))
+    return _render(blocks, units, _select(units, ranked, budget))
+
+
+def _select(units: List[Tuple[int, int, str, int]], ranked: List[int], budget: int) -> set:
+    selected = set()
+    used = 0
+    for position in ranked:
+        tokens = units[position][3]
+        if used + tokens > budget and selected:
+            continue
+        selected.add(position)
+        used += tokens
+        if used >= budget:
+            break
+    return selected
+
+
+def _render(blocks: List[Tuple[str, str]], units: List[Tuple[int, int, str, int]], selected: set) -> str:
+    lines: List[str] = []
+    current_block = -1
+    for position in sorted(selected):
+        block_index, _, sentence, _ = units[position]
+        if block_index != current_block:
+            label = blocks[block_index][0]
+            lines.append(f"{label}: {sentence}" if label else sentence)
+            current_block = block_index
+        else:
+            lines[-1] += f" {sentence}"
+    return "\n".join(lines)
+
+
+def _terms(text: str) -> List[str]:
+    return [w for w in (m.lower() for m in _WORD.findall(text)) if w not in _STOPWORDS]
+
+
+class CompressionEngine:
+    """Local extractive compressor with checkpoint-based incremental updates"""
+
+    default_chunk_tokens = 4000
+    default_fan_out = 4
+
+    async def compress(self, conversation: Conversation, options: Dict[str, Any],
+                       checkpoint: Optional[CompressionCheckpoint] = None) -> CompressionResult:
+        """
+        Compress a conversation. When a valid checkpoint is given, only the messages
+        after its watermark are compressed and appended to the stored summary.
+        """
+        start = time.perf_counter()
+        ratio = float(options.get("compression_ratio", 0.8))
+
+        previous_summary = ""
+        previous_tokens = 0
+        delta = conversation.messages
+        if checkpoint and self.can_resume(checkpoint, conversation, options):
+            previous_summary = checkpoint.summary
+            previous_tokens = checkpoint.original_token_count
+            delta = conversation.messages[checkpoint.message_count:]
+
+        blocks = [(message.role.value, message.content) for message in delta]
+        delta_tokens = sum(estimate_tokens(text) for _, text in blocks)
+        if options.get("extractive_only"):
+            # Deadline fallback: positional lead extraction, no term scoring or merge tree
+            delta_summary = await cpu_executor.run(
+                _lead_extract, blocks, max(1, round(delta_tokens * (1 - ratio))), tokens=delta_tokens
+            )
+        elif options.get("hierarchical"):
+            delta_summary, delta_tokens = await self._compress_hierarchical(
+                delta,
+                ratio,
+                int(options.get("chunk_size_tokens") or self.default_chunk_tokens),
+                int(options.get("merge_fan_out") or self.default_fan_out)
+            )
+        else:
+            delta_summary, delta_tokens = await cpu_executor.run(_compress_blocks, blocks, ratio, tokens=delta_tokens)
+        summary = "\n".join(part for part in (previous_summary, delta_summary) if part)
+
+        original_tokens = previous_tokens + delta_tokens
+        compressed_tokens = estimate_tokens(summary)
+        return CompressionResult(
+            compressed_content=summary,
+            original_token_count=original_tokens,
+            compressed_token_count=compressed_tokens,
+            compression_ratio=1 - compressed_tokens / original_tokens if original_tokens else 0.0,
+            extracted_facts=[],
+            processing_time=time.perf_counter() - start
+        )
+
+    def can_resume(self, checkpoint: CompressionCheckpoint, conversation: Conversation,
+                   options: Dict[str, Any]) -> bool:
+        """Check that the checkpoint covers an unchanged prefix of the conversation under the same options"""
+        count = checkpoint.message_count
+        if checkpoint.conversation_id != conversation.id or checkpoint.options_digest != options_digest(options):
+            return False
+        if count == 0 or count > len(conversation.messages):
+            return False
+        return message_fingerprint(conversation.messages[count - 1]) == checkpoint.last_message_hash
+
+    def build_checkpoint(self, conversation: Conversation, result: CompressionResult,
+                         options: Dict[str, Any]) -> Optional[CompressionCheckpoint]:
+        """Create the checkpoint covering every message of the compressed conversation"""
+        if not conversation.messages:
+            return None
+        return CompressionCheckpoint(
+            conversation_id=conversation.id,
+            compression_ratio=float(options.get("compression_ratio", 0.8)),
+            options_digest=options_digest(options),
+            summary=result.compressed_content,
+            message_count=len(conversation.messages),
+            last_message_hash=message_fingerprint(conversation.messages[-1]),
+            original_token_count=result.original_token_count
+        )
+
+    async def _compress_hierarchical(self, messages: List[Message], ratio: float,
+                                     chunk_tokens: int, fan_out: int) -> Tuple[str, int]:
+        """Map-reduce: compress token-bounded chunks in parallel worker processes, then merge summaries in a tree"""
+        chunks = [[(message.role.value, message.content) for message in chunk]
+                  for chunk in self._chunk_messages(messages, chunk_tokens)]
+        # Offload decisions go by the whole input so a large one never runs chunk by chunk inline
+        input_tokens = sum(estimate_tokens(message.content) for message in messages)
+        partials = await asyncio.gather(*(
+            cpu_executor.run(_compress_blocks, chunk, ratio, tokens=input_tokens) for chunk in chunks
+        ))
+
+        total_tokens = sum(tokens for _, tokens in partials)
+        target = max(1, round(total_tokens * (1 - ratio)))
+        summaries = [summary for summary, _ in partials if summary]
+        while len(summaries) > 1:
+            current = sum(estimate_tokens(summary) for summary in summaries)
+            scale = min(1.0, target / current)
+            groups = [summaries[i:i + fan_out] for i in range(0, len(summaries), fan_out)]
+            summaries = list(await asyncio.gather(*(
+                cpu_executor.run(_merge_summaries, group, scale, tokens=input_tokens) for group in groups
+            )))
+        return (summaries[0] if summaries else ""), total_tokens
+
+    @staticmethod
+    def _chunk_messages(messages: List[Message], chunk_tokens: int) -> List[List[Message]]:
+        """Split messages into chunks of at most chunk_tokens, never splitting a message"""
+        chunks: List[List[Message]] = []
+        current: List[Message] = []
+        current_tokens = 0
+        for message in messages:
+            tokens = estimate_tokens(message.content)
+            if current and current_tokens + tokens > chunk_tokens:
+                chunks.append(current)
+                current, current_tokens = [], 0
+            current.append(message)
+            current_tokens += tokens
+        if current:
+            chunks.append(current)
+        return chunks
@@ -0,0 +1,98 @@
+import time
+from typing import Dict, Any, List, Optional
+
+from monitoring.metrics import PIPELINE_DEGRADATIONS
+
+
+# Share of the request deadline given to each stage; time left over by a stage rolls forward
+DEFAULT_STAGE_SHARES = {
+    "preprocessing": 0.1,
+    "compression": 0.5,
+    "verification": 0.25,
+    "optimization": 0.1,
+    "persistence": 0.05,
+}
+
+# Conservative starting estimates in seconds per 1k input tokens, refined from observed runs
+DEFAULT_STAGE_COSTS = {
+    "preprocessing": 0.004,
+    "compression": 0.01,
+    "verification": 0.006,
+    "optimization": 0.001,
+    "persistence": 0.001,
+}
+
+
+class StageCostModel:
+    """Exponentially weighted estimate of each stage's cost per 1k input tokens"""
+
+    def __init__(self, alpha: float = 0.2, initial: Optional[Dict[str, float]] = None):
+        self.alpha = alpha
+        self.costs = dict(initial or DEFAULT_STAGE_COSTS)
+
+    def observe(self, stage: str, tokens: int, seconds: float) -> None:
+        if tokens <= 0:
+            return
+        cost = seconds * 1000 / tokens
+        previous = self.costs.get(stage)
+        self.costs[stage] = cost if previous is None else previous + self.alpha * (cost - previous)
+
+    def predict(self, stage: str, tokens: int) -> float:
+        return self.costs.get(stage, 0.0) * tokens / 1000
+
+
+class Deadline:
+    """
+    Per-run time budget split across pipeline stages, recording any degradation taken.
+    The clock starts at enqueued_at (epoch seconds the request was queued) when given, so
+    time spent waiting for a worker counts against the deadline.
+    """
+
+    def __init__(self, deadline_ms: Optional[int], cost_model: StageCostModel,
+                 shares: Optional[Dict[str, float]] = None, enqueued_at: Optional[float] = None):
+        self.deadline_ms = deadline_ms
+        self.cost_model = cost_model
+        self.shares = shares or DEFAULT_STAGE_SHARES
+        self.queued = max(0.0, time.time() - enqueued_at) if enqueued_at else 0.0
+        self.started = time.perf_counter() - self.queued
+        self.expires = self.started + deadline_ms / 1000 if deadline_ms else None
+        self.degradations: List[Dict[str, Any]] = []
+
+    @property
+    def enabled(self) -> bool:
+        return self.expires is not None
+
+    def remaining(self) -> float:
+        if self.expires is None:
+            return float("inf")
+        return max(0.0, self.expires - time.perf_counter())
+
+    def budget(self, stage: str) -> float:
+        """Seconds available to a stage: its share of whatever time the later stages leave"""
+        if self.expires is None:
+            return float("inf")
+        stages = list(self.shares)
+        later = stages[stages.index(stage):] if stage in self.shares else [stage]
+        total = sum(self.shares.get(name, 0.0) for name in later)
+        return self.remaining() * (self.shares.get(stage, 0.0) / total if total else 1.0)
+
+    def headroom(self, stage: str, tokens: int) -> float:
+        """Ratio of the stage budget to its predicted cost; below 1.0 the stage is expected to overrun"""
+        predicted = self.cost_model.predict(stage, tokens)
+        if predicted <= 0:
+            return float("inf")
+        return self.budget(stage) / predicted
+
+    def degrade(self, stage: str, strategy: str, **details: Any) -> None:
+        self.degradations.append({"stage": stage, "strategy": strategy, **details})
+        PIPELINE_DEGRADATIONS.inc(stage=stage, strategy=strategy)
+
+    def summary(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "deadline_ms": self.deadline_ms,
+            "elapsed_ms": round(elapsed * 1000, 1),
+            "queued_ms": round(self.queued * 1000, 1),
+            "deadline_met": self.expires is None or elapsed * 1000 <= self.deadline_ms,
+            "degradations": self.degradations
+        }
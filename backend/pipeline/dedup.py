@@ -0,0 +1,176 @@
+import hashlib
+import math
+import re
+from collections import Counter
+from typing import Dict, Any, List, Tuple
+
+import numpy as np
+
+from models.schemas import Conversation
+from pipeline.compressor import estimate_tokens
+
+
+_WORD = re.compile(r"\w+")
+_BITS = 64
+_MIX = (np.uint64(0x9E3779B97F4A7C15), np.uint64(0xC2B2AE3D27D4EB4F), np.uint64(0x165667B19E3779F9))
+MAX_BANDS = 10
+
+
+def _word_hash(word: str) -> int:
+    return int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _finalize(h: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer so every output bit depends on every input bit"""
+    h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return h ^ (h >> np.uint64(31))
+
+
+def _cosine(a: Tuple[Counter, float], b: Tuple[Counter, float]) -> float:
+    """Cosine similarity of two (word counts, norm) pairs"""
+    (counts_a, norm_a), (counts_b, norm_b) = a, b
+    if len(counts_b) < len(counts_a):
+        counts_a, counts_b = counts_b, counts_a
+    dot = sum(n * counts_b[w] for w, n in counts_a.items() if w in counts_b)
+    return dot / (norm_a * norm_b)
+
+
+class NearDuplicateFilter:
+    """
+    Drops near-duplicate messages. SimHash fingerprints with banded bucket lookup find
+    candidates in sub-quadratic time; the cosine similarity of word counts confirms them.
+    """
+
+    def __init__(self, shingle_size: int = 1, min_words: int = 8, max_candidates: int = 32,
+                 max_verified: int = 4):
+        # Single words: a one-word edit moves a short message's shingles far more than its words
+        self.shingle_size = shingle_size
+        self.min_words = min_words
+        # Bucket entries scanned and exact comparisons made per message, bounding the work
+        # when buckets crowd (low thresholds, repetitive conversations)
+        self.max_candidates = max_candidates
+        self.max_verified = max_verified
+
+    def fingerprints(self, texts: List[str]) -> List[int]:
+        """Compute 64-bit SimHash fingerprints for a batch of texts"""
+        return self._fingerprints([_WORD.findall(text.lower()) for text in texts])
+
+    def _fingerprints(self, tokenized: List[List[str]]) -> List[int]:
+        word_hashes: Dict[str, int] = {}
+        shingle_hashes: List[np.ndarray] = []
+        counts = []
+        size = self.shingle_size
+        with np.errstate(over="ignore"):
+            for words in tokenized:
+                if not words:
+                    words = [""]
+                for w in words:
+                    if w not in word_hashes:
+                        word_hashes[w] = _word_hash(w)
+                ids = np.array([word_hashes[w] for w in words], dtype=np.uint64)
+                width = min(size, len(ids))
+                combined = np.zeros(len(ids) - width + 1, dtype=np.uint64)
+                for j in range(width):
+                    combined += ids[j:len(ids) - width + 1 + j] * _MIX[j % len(_MIX)]
+                shingle_hashes.append(_finalize(combined))
+                counts.append(len(combined))
+
+        if not shingle_hashes:
+            return []
+
+        # Column-wise bit counts over the whole batch, summed per message
+        hashes = np.concatenate(shingle_hashes)
+        counts_arr = np.array(counts)
+        starts = np.concatenate(([0], np.cumsum(counts_arr)[:-1]))
+        fingerprints = np.zeros(len(tokenized), dtype=np.uint64)
+        for bit in range(_BITS):
+            column = ((hashes >> np.uint64(bit)) & np.uint64(1)).astype(np.int32)
+            majority = np.add.reduceat(column, starts) * 2 > counts_arr
+            fingerprints |= majority.astype(np.uint64) << np.uint64(bit)
+        return [int(f) for f in fingerprints]
+
+    def deduplicate(self, conversation: Conversation, threshold: float) -> Tuple[Conversation, List[Dict[str, Any]]]:
+        """Keep the first message of each near-duplicate group (same role, word cosine >= threshold)"""
+        messages = conversation.messages
+        tokenized = [_WORD.findall(m.content.lower()) for m in messages]
+        fingerprints = self._fingerprints(tokenized)
+        # Bit distance SimHash is expected to show at this cosine, plus three standard deviations
+        # of its noise, so fingerprints only pre-filter and the exact cosine decides
+        flip = math.acos(min(1.0, max(0.0, threshold))) / math.pi
+        max_distance = int(_BITS * flip + 3 * math.sqrt(_BITS * flip * (1 - flip)))
+
+        # A fixed band count keeps bands wide enough that unrelated messages rarely share a
+        # bucket, however low the threshold; pairs past the pigeonhole bound are found with
+        # high probability rather than always
+        bands = min(MAX_BANDS, max_distance + 1)
+        edges = [round(i * _BITS / bands) for i in range(bands + 1)]
+        masks = [((1 << (hi - lo)) - 1, lo) for lo, hi in zip(edges, edges[1:])]
+
+        buckets: Dict[Tuple[str, int, int], List[int]] = {}
+        words: Dict[int, Tuple[Counter, float]] = {}
+
+        def word_counts(i: int) -> Tuple[Counter, float]:
+            # Built on first comparison; most messages never reach the exact check
+            if i not in words:
+                counts = Counter(tokenized[i])
+                words[i] = (counts, math.sqrt(sum(n * n for n in counts.values())))
+            return words[i]
+
+        dropped: List[Dict[str, Any]] = []
+        kept = []
+        for index, message in enumerate(messages):
+            if len(tokenized[index]) < self.min_words:
+                kept.append(message)
+                continue
+
+            fingerprint = fingerprints[index]
+            keys = [(message.role.value, band, (fingerprint >> shift) & mask)
+                    for band, (mask, shift) in enumerate(masks)]
+            seen = set()
+            for key in keys:
+                # Most recent first: retries and regenerations sit close to what they repeat
+                for candidate in reversed(buckets.get(key, ())):
+                    seen.add(candidate)
+                    if len(seen) >= self.max_candidates:
+                        break
+                if len(seen) >= self.max_candidates:
+                    break
+            # Confirm only the fingerprint-closest few, bounding exact comparisons per message
+            closest = sorted(
+                (distance, candidate) for distance, candidate in
+                (((fingerprint ^ fingerprints[c]).bit_count(), c) for c in seen) if distance <= max_distance
+            )[:self.max_verified]
+            duplicate_of = None
+            similarity = 0.0
+            for _, candidate in closest:
+                similarity = _cosine(word_counts(index), word_counts(candidate))
+                if similarity >= threshold:
+                    duplicate_of = candidate
+                    break
+
+            if duplicate_of is None:
+                for key in keys:
+                    buckets.setdefault(key, []).append(index)
+                kept.append(message)
+            else:
+                dropped.append({
+                    "index": index,
+                    "duplicate_of": duplicate_of,
+                    "similarity": round(similarity, 4),
+                    "tokens": estimate_tokens(message.content)
+                })
+
+        return conversation.copy(update={"messages": kept}), dropped
+
+    @staticmethod
+    def stats(dropped: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Summary of dropped messages for pipeline metrics"""
+        return {
+            "near_duplicates_dropped": len(dropped),
+            "near_duplicate_tokens_saved": sum(d["tokens"] for d in dropped),
+            "near_duplicates": [
+                {"index": d["index"], "duplicate_of": d["duplicate_of"], "similarity": d["similarity"]}
+                for d in dropped
+            ]
+        }
@@ -0,0 +1,53 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+
+# Below this many estimated tokens a stage finishes faster inline than a round trip to a worker
+OFFLOAD_MIN_TOKENS = 4000
+
+
+class CPUExecutor:
+    """
+    Process pool for the CPU-bound pipeline stages. They are pure Python, so threads would
+    still hold the GIL; worker processes keep the event loop (HTTP requests, job heartbeats)
+    responsive and let independent chunks run on separate cores.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        # Started on first use; spawned rather than forked since the parent runs threads
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pool
+
+    async def run(self, fn: Callable[..., Any], *args: Any, tokens: Optional[int] = None) -> Any:
+        """Run fn(*args) in a worker process; fn and its arguments must be picklable"""
+        if tokens is not None and tokens < OFFLOAD_MIN_TOKENS:
+            return fn(*args)
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.pool, fn, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed); start a fresh pool for the next call
+            self._pool = None
+            raise
+
+    def shutdown(self) -> None:
+        """Stop the worker processes; called on application shutdown"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# Global CPU executor instance
+cpu_executor = CPUExecutor()
@@ -0,0 +1,86 @@
+import hashlib
+import re
+from typing import Dict, List, Tuple
+
+from models.schemas import Conversation, CompressionResult, CodeBlockRef
+from pipeline.compressor import estimate_tokens
+
+
+# Fenced code block: opening fence with optional info string, body, matching closing fence
+_FENCE = re.compile(
+    r"^(?P<fence>`{3,}|~{3,})[ \t]*(?P<lang>[\w+#.-]*)[^\n]*\n(?P<code>.*?)^(?P=fence)[ \t]*$",
+    re.MULTILINE | re.DOTALL
+)
+
+
+def _normalize_code(code: str) -> str:
+    """Ignore indentation, trailing whitespace and blank lines so near-identical copies collide"""
+    return "\n".join(line.strip() for line in code.splitlines() if line.strip())
+
+
+class CodeSegmenter:
+    """Splits messages into prose and fenced code, replacing repeated code with references"""
+
+    def segment(self, conversation: Conversation) -> Tuple[Conversation, Dict[str, CodeBlockRef]]:
+        """Return the prose-only conversation and the deduplicated code blocks keyed by reference"""
+        blocks: Dict[str, CodeBlockRef] = {}
+        messages = []
+        for message_index, message in enumerate(conversation.messages):
+            content = message.content
+            if "```" not in content and "~~~" not in content:
+                messages.append(message)
+                continue
+
+            parts: List[str] = []
+            position = 0
+            for match in _FENCE.finditer(content):
+                code = match.group("code")
+                digest = hashlib.sha1(_normalize_code(code).encode("utf-8")).hexdigest()[:12]
+                ref = f"[code:{digest}]"
+                block = blocks.get(ref)
+                if block is None:
+                    block = blocks[ref] = CodeBlockRef(ref=ref, language=match.group("lang"), code=code)
+                block.occurrences += 1
+                if message_index not in block.message_indices:
+                    block.message_indices.append(message_index)
+
+                parts.append(content[position:match.start()])
+                parts.append(ref)
+                position = match.end()
+            parts.append(content[position:])
+            messages.append(message.copy(update={"content": "".join(parts)}))
+
+        return conversation.copy(update={"messages": messages}), blocks
+
+    def render(self, blocks: Dict[str, CodeBlockRef]) -> str:
+        """Render each unique code block once, labelled with its reference"""
+        return "\n\n".join(
+            f"{block.ref}\n```{block.language}\n{block.code}```" for block in blocks.values()
+        )
+
+    def attach(self, result: CompressionResult, blocks: Dict[str, CodeBlockRef]) -> CompressionResult:
+        """Append the preserved code to a prose compression result and fix up its token counts"""
+        if not blocks:
+            return result
+        content = f"{result.compressed_content}\n\n{self.render(blocks)}"
+        original_tokens = result.original_token_count + sum(
+            estimate_tokens(block.code) * block.occurrences for block in blocks.values()
+        )
+        compressed_tokens = estimate_tokens(content)
+        return result.copy(update={
+            "compressed_content": content,
+            "original_token_count": original_tokens,
+            "compressed_token_count": compressed_tokens,
+            "compression_ratio": 1 - compressed_tokens / original_tokens if original_tokens else 0.0
+        })
+
+    @staticmethod
+    def stats(blocks: Dict[str, CodeBlockRef]) -> Dict[str, int]:
+        """Summary of the deduplication for pipeline metrics"""
+        return {
+            "code_blocks_unique": len(blocks),
+            "code_blocks_total": sum(block.occurrences for block in blocks.values()),
+            "code_tokens_deduplicated": sum(
+                estimate_tokens(block.code) * (block.occurrences - 1) for block in blocks.values()
+            )
+        }
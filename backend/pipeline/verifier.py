@@ -1,18 +1,142 @@
-from typing import Dict, Any
+import re
+import time
+from collections import defaultdict
+from typing import Dict, Any, List, Iterator, Optional, Tuple
+
+from models.schemas import Message, VerificationResult
+from pipeline.compressor import estimate_tokens
+from pipeline.executor import cpu_executor
+
+
+_TOKEN = re.compile(r"\w+")
+_CLAIM_SPLIT = re.compile(r'(?<=[.!?])\s+|\n+')
+_ROLE_PREFIX = re.compile(r"^(?:user|assistant|system):\s*")
+
+
+class ShingleIndex:
+    """Inverted index of word n-gram shingles over conversation messages"""
+
+    def __init__(self, messages: List[Message], size: int = 3, max_postings: int = 512):
+        self.size = size
+        self.max_postings = max_postings
+        self.postings: Dict[int, List[Tuple[int, int, int]]] = defaultdict(list)
+        for message_index, message in enumerate(messages):
+            for key, start, end in self.shingles(message.content):
+                self.postings[key].append((message_index, start, end))
+
+    def shingles(self, text: str) -> Iterator[Tuple[int, int, int]]:
+        """Yield (hash, start offset, end offset) for every word n-gram in text"""
+        tokens = list(_TOKEN.finditer(text))
+        words = [t.group().lower() for t in tokens]
+        last = self.size - 1
+        for i, gram in enumerate(zip(*(words[j:] for j in range(self.size)))):
+            yield hash(gram), tokens[i].start(), tokens[i + last].end()
+
+    def best_source(self, claim: str) -> Dict[str, Any]:
+        """Find the message sharing the most shingles with the claim"""
+        claim_shingles = {key for key, _, _ in self.shingles(claim)}
+        coverage: Dict[int, int] = defaultdict(int)
+        spans: Dict[int, List[int]] = {}
+        for key in claim_shingles:
+            postings = self.postings.get(key)
+            if not postings:
+                continue
+            seen = set()
+            # Very common shingles carry no grounding signal, only scan a bounded prefix
+            for message_index, start, end in postings[:self.max_postings]:
+                if message_index in seen:
+                    continue
+                seen.add(message_index)
+                coverage[message_index] += 1
+                span = spans.setdefault(message_index, [start, end])
+                span[0] = min(span[0], start)
+                span[1] = max(span[1], end)
+
+        if not coverage or not claim_shingles:
+            return {"coverage": 0.0}
+        message_index = max(coverage, key=coverage.__getitem__)
+        return {
+            "coverage": coverage[message_index] / len(claim_shingles),
+            "message_index": message_index,
+            "start": spans[message_index][0],
+            "end": spans[message_index][1]
+        }
+
 
 class VerificationLayer:  # Namnet ska vara VerificationLayer (main.py kräver det)
-    """Verifies quality of compressed content"""
-    
-    async def verify(self, original: Any, compressed: Any) -> Any: # Ändra till Any
+    """Verifies that compressed content is grounded in the original messages"""
+
+    stride = 8
+
+    def __init__(self, shingle_size: int = 3, min_coverage: float = 0.5):
+        self.shingle_size = shingle_size
+        self.min_coverage = min_coverage
+
+    async def verify(self, compressed_content: str, messages: List[Message],
+                     sample_rate: float = 1.0, stop_at: Optional[float] = None) -> VerificationResult:
+        """
+        Ground every claim in the source messages. With sample_rate below 1.0 only an evenly
+        spaced subset of claims is checked and the grounding score is estimated from it;
+        checking also stops once time.perf_counter() passes stop_at. Large inputs are
+        checked in a CPU worker process so the event loop stays responsive.
+        """
+        tokens = sum(estimate_tokens(message.content) for message in messages)
+        return await cpu_executor.run(self._verify, compressed_content, messages, sample_rate, stop_at, tokens=tokens)
+
+    def _verify(self, compressed_content: str, messages: List[Message],
+                sample_rate: float, stop_at: Optional[float]) -> VerificationResult:
+        index = ShingleIndex(messages, self.shingle_size)
+
+        claims = self.extract_claims(compressed_content)
+        checked = list(enumerate(claims))
+        if sample_rate < 1.0 and claims:
+            count = max(1, int(len(claims) * sample_rate))
+            checked = [checked[i * len(claims) // count] for i in range(count)]
+        if stop_at is not None:
+            # Visit claims in strided passes so a cut-off still covers the whole summary
+            checked = [item for offset in range(self.stride) for item in checked[offset::self.stride]]
+        claim_sources: List[Dict[str, Any]] = []
+        failed: List[Dict[str, Any]] = []
+        for position, (claim_index, claim) in enumerate(checked):
+            if stop_at is not None and position and position % 32 == 0 and time.perf_counter() > stop_at:
+                checked = checked[:position]
+                break
+            match = index.best_source(claim)
+            if match["coverage"] >= self.min_coverage:
+                claim_sources.append({"claim_index": claim_index, **match})
+            else:
+                failed.append({"claim_index": claim_index, "claim": claim, "coverage": match["coverage"]})
+
+        verified = len(claim_sources)
+        return VerificationResult(
+            verified_content=compressed_content,
+            total_claims=len(claims),
+            verified_claims=verified,
+            grounding_score=verified / len(checked) if checked else 1.0,
+            corrections=[],
+            failed_verifications=failed,
+            claim_sources=claim_sources,
+            checked_claims=len(checked)
+        )
+
+    def unverified(self, compressed_content: str) -> VerificationResult:
+        """Result for content whose verification was skipped; no claim counts as grounded"""
+        claims = self.extract_claims(compressed_content)
         return VerificationResult(
-            grounding_score=0.95,
-            issues=[],
-            verdict="pass"
+            verified_content=compressed_content,
+            total_claims=len(claims),
+            verified_claims=0,
+            grounding_score=0.0,
+            corrections=[],
+            failed_verifications=[],
+            checked_claims=0
         )
 
-class VerificationResult:
-    def __init__(self, **kwargs):
-        for k, v in kwargs.items():
-            setattr(self, k, v)
-    def dict(self):
-        return self.__dict__
+    def extract_claims(self, compressed_content: str) -> List[str]:
+        """Split compressed text into sentence claims long enough to be shingled"""
+        claims = []
+        for line in compressed_content.splitlines():
+            for sentence in _CLAIM_SPLIT.split(_ROLE_PREFIX.sub("", line.strip())):
+                if len(_TOKEN.findall(sentence)) >= self.shingle_size:
+                    claims.append(sentence.strip())
+        return claims
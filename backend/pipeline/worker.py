@@ -0,0 +1,91 @@
+import asyncio
+import os
+import socket
+from typing import Dict, Any, Awaitable, Callable, List, Optional
+
+from db.sqlite import DatabaseManager
+from monitoring.metrics import PIPELINE_QUEUE_DEPTH
+
+
+JobHandler = Callable[[Dict[str, Any], str], Awaitable[None]]
+
+
+class PipelineWorker:
+    """
+    Claims pipeline jobs from the SQLite job table and runs them. Every uvicorn worker
+    process runs one of these; jobs of crashed workers are recovered once their lease expires.
+    """
+
+    def __init__(self, db_manager: DatabaseManager, handler: JobHandler, concurrency: int = 2,
+                 poll_interval: float = 0.5, lease_seconds: float = 30.0, max_attempts: int = 3):
+        self.db_manager = db_manager
+        self.handler = handler
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.running_jobs: Dict[str, asyncio.Task] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._slot_loop()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._maintenance_loop()))
+
+    async def stop(self) -> None:
+        """Stop claiming, cancel running jobs and hand them back to the queue"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self) -> None:
+        """Wake idle slots after jobs were queued by this process"""
+        if self._wakeup:
+            self._wakeup.set()
+
+    async def _slot_loop(self) -> None:
+        while True:
+            try:
+                job = await self.db_manager.claim_job(self.worker_id)
+            except Exception as e:
+                print(f"Pipeline worker failed to claim a job: {e}")
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            task = asyncio.create_task(self.handler(job, self.worker_id))
+            self.running_jobs[job["id"]] = task
+            try:
+                await asyncio.shield(task)
+            except asyncio.CancelledError:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                await self.db_manager.release_job(job["id"], self.worker_id)
+                raise
+            except Exception as e:
+                print(f"Pipeline job {job['id']} crashed: {e}")
+            finally:
+                self.running_jobs.pop(job["id"], None)
+
+    async def _maintenance_loop(self) -> None:
+        while True:
+            try:
+                await self.db_manager.heartbeat_jobs(self.worker_id)
+                recovered = await self.db_manager.recover_stale_jobs(self.lease_seconds, self.max_attempts)
+                if recovered:
+                    print(f"Recovered {recovered} stale pipeline job(s)")
+                    self.notify()
+                PIPELINE_QUEUE_DEPTH.set(await self.db_manager.count_pending_jobs())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Pipeline worker maintenance failed: {e}")
+            await asyncio.sleep(self.lease_seconds / 3)
@@ -14,7 +14,8 @@ from models.database_models import UserAPIKeyDB
 from security.encryption import encryption_service
 from security.rate_limiter import check_rate_limit
 from routes.auth import validate_user_session
-from database.supabase_client import supabase_manager
+from database.key_cache import api_key_cache
+from database.audit_writer import audit_writer
 
 
 router = APIRouter(prefix="/api/user/keys", tags=["api-keys"])
@@ -30,14 +31,14 @@ async def list_api_keys(
         await check_rate_limit(request, current_user["user_id"])
         
         # Log the action
-        await supabase_manager.log_security_audit(
+        audit_writer.log(
             user_id=current_user["user_id"],
             action="list_api_keys",
             user_agent=request.headers.get("user-agent"),
             ip_address=request.client.host if request.client else None
         )
         
-        keys_data = await supabase_manager.get_user_api_keys(current_user["user_id"])
+        keys_data = await api_key_cache.get_user_keys(current_user["user_id"])
         
         keys = [
             APIKeyResponse(
@@ -73,11 +74,11 @@ async def create_or_update_api_key(
         encrypted_key = encryption_service.encrypt_api_key(key_data.api_key)
         
         # Store in database
-        db_key = await supabase_manager.upsert_api_key(
+        db_key = await api_key_cache.upsert_api_key(
             user_id=current_user["user_id"],
             service_name=key_data.service_name,
             encrypted_key=encrypted_key,
-            key_version=1
+            key_version=encryption_service.current_version
         )
         
         if not db_key:
@@ -87,7 +88,7 @@ async def create_or_update_api_key(
             )
         
         # Log the action
-        await supabase_manager.log_security_audit(
+        audit_writer.log(
             user_id=current_user["user_id"],
             action="upsert_api_key",
             service_name=key_data.service_name,
@@ -123,7 +124,7 @@ async def delete_api_key(
         await check_rate_limit(request, current_user["user_id"])
         
         # Verify the key exists
-        existing_key = await supabase_manager.get_api_key(current_user["user_id"], service_name)
+        existing_key = await api_key_cache.get_api_key(current_user["user_id"], service_name)
         if not existing_key:
             raise HTTPException(
                 status_code=HTTP_404_NOT_FOUND,
@@ -131,7 +132,7 @@ async def delete_api_key(
             )
         
         # Delete the key
-        success = await supabase_manager.delete_api_key(current_user["user_id"], service_name)
+        success = await api_key_cache.delete_api_key(current_user["user_id"], service_name)
         
         if not success:
             raise HTTPException(
@@ -140,7 +141,7 @@ async def delete_api_key(
             )
         
         # Log the action
-        await supabase_manager.log_security_audit(
+        audit_writer.log(
             user_id=current_user["user_id"],
             action="delete_api_key",
             service_name=service_name,
@@ -171,8 +172,9 @@ async def rotate_encryption_keys(
     try:
         await check_rate_limit(request, current_user["user_id"])
         
-        # Get all user keys
-        keys_data = await supabase_manager.get_user_api_keys(current_user["user_id"])
+        # Get all user keys, refreshed so rotation never re-encrypts a stale copy
+        api_key_cache.invalidate(current_user["user_id"])
+        keys_data = await api_key_cache.get_user_keys(current_user["user_id"])
         
         if not keys_data:
             return SuccessResponse(
@@ -180,4 +182,28 @@ async def rotate_encryption_keys(
                 service_name="all"
             )
         
-        #
\ No newline at end of file
+        # Re-encrypt everything still on an older key version, then persist in one upsert
+        rotated = await encryption_service.rotate_api_keys(keys_data)
+        await api_key_cache.bulk_upsert_api_keys(rotated)
+        
+        # Log the action
+        audit_writer.log(
+            user_id=current_user["user_id"],
+            action="rotate_api_keys",
+            service_name="all",
+            user_agent=request.headers.get("user-agent"),
+            ip_address=request.client.host if request.client else None
+        )
+        
+        return SuccessResponse(
+            message=f"Rotated {len(rotated)} of {len(keys_data)} API keys to key version {encryption_service.current_version}",
+            service_name="all"
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to rotate API keys: {str(e)}"
+        )
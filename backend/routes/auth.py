@@ -1,4 +1,9 @@
-from typing import Optional, Dict, Any
+import hashlib
+import heapq
+import math
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Callable, List, Tuple
 from fastapi import HTTPException, Depends, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from starlette.status import HTTP_401_UNAUTHORIZED, HTTP_403_FORBIDDEN
@@ -6,17 +11,122 @@ import jwt
 from datetime import datetime
 
 from config import settings
+from monitoring.metrics import AUTH_TOKEN_CACHE
 
 
 security = HTTPBearer()
 
 
+class VerifiedTokenCache:
+    """Bounded LRU of verified token claims keyed by token digest, expiring with the token's exp"""
+    
+    def __init__(self, max_size: int = 10000, max_ttl: float = 300.0):
+        self.max_size = max_size
+        self.max_ttl = max_ttl
+        self.entries: "OrderedDict[bytes, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        # Digests of revoked tokens, kept until the token would have expired anyway; tokens
+        # without an exp never expire, so their revocation is kept for good (until is inf)
+        self.revoked: Dict[bytes, float] = {}
+        # Min-heap of (until, digest) so lapsed revocations are swept even if never presented again
+        self._revoked_expiry: List[Tuple[float, bytes]] = []
+    
+    @staticmethod
+    def digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+    
+    def get(self, digest: bytes, now: float) -> Optional[Dict[str, Any]]:
+        entry = self.entries.get(digest)
+        if entry is None:
+            return None
+        payload, expires_at = entry
+        if now >= expires_at:
+            del self.entries[digest]
+            return None
+        self.entries.move_to_end(digest)
+        return payload
+    
+    def put(self, digest: bytes, payload: Dict[str, Any], now: float) -> None:
+        expires_at = now + self.max_ttl
+        if isinstance(payload.get("exp"), (int, float)):
+            expires_at = min(expires_at, payload["exp"])
+        if expires_at <= now:
+            return
+        self._sweep_revoked(now)
+        self.entries[digest] = (payload, expires_at)
+        self.entries.move_to_end(digest)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+    
+    def revoke(self, digest: bytes, until: float) -> None:
+        self.entries.pop(digest, None)
+        self._sweep_revoked(time.time())
+        self.revoked[digest] = until
+        if until != math.inf:
+            heapq.heappush(self._revoked_expiry, (until, digest))
+    
+    def _sweep_revoked(self, now: float) -> None:
+        while self._revoked_expiry and self._revoked_expiry[0][0] <= now:
+            until, digest = heapq.heappop(self._revoked_expiry)
+            # Skip heap entries superseded by a later revoke or already dropped by is_revoked
+            if self.revoked.get(digest) == until:
+                del self.revoked[digest]
+    
+    def is_revoked(self, digest: bytes, now: float) -> bool:
+        until = self.revoked.get(digest)
+        if until is None:
+            return False
+        if now >= until:
+            del self.revoked[digest]
+            return False
+        return True
+
+
 class JWTValidator:
-    def __init__(self):
+    def __init__(self, cache_size: int = 10000,
+                 revocation_hook: Optional[Callable[[Dict[str, Any]], bool]] = None):
         self.secret_key = settings.jwt_secret
+        self.cache = VerifiedTokenCache(max_size=cache_size)
+        # Called with the claims of every token, cached or not; returning True rejects the token
+        self.revocation_hook = revocation_hook
     
     def validate_token(self, token: str) -> Dict[str, Any]:
-        """Validate JWT token and return payload"""
+        """Validate JWT token and return payload, reusing claims of tokens verified before"""
+        now = time.time()
+        digest = self.cache.digest(token)
+        if self.cache.is_revoked(digest, now):
+            raise HTTPException(
+                status_code=HTTP_401_UNAUTHORIZED,
+                detail="Token has been revoked"
+            )
+        
+        payload = self.cache.get(digest, now)
+        if payload is not None:
+            AUTH_TOKEN_CACHE.inc(result="hit")
+        else:
+            AUTH_TOKEN_CACHE.inc(result="miss")
+            payload = self._decode(token)
+            self.cache.put(digest, payload, now)
+        
+        if self.revocation_hook and self.revocation_hook(payload):
+            self.cache.revoke(digest, payload.get("exp", math.inf))
+            raise HTTPException(
+                status_code=HTTP_401_UNAUTHORIZED,
+                detail="Token has been revoked"
+            )
+        return payload
+    
+    def revoke_token(self, token: str) -> None:
+        """Reject a token from now on, even though its signature and exp are still valid"""
+        digest = self.cache.digest(token)
+        try:
+            payload = jwt.decode(token, self.secret_key, algorithms=["HS256"], options={"verify_exp": False})
+            until = payload.get("exp", math.inf)
+        except jwt.InvalidTokenError:
+            # _decode rejects these on its own; the entry only short-circuits repeat attempts
+            until = time.time() + self.cache.max_ttl
+        self.cache.revoke(digest, until)
+    
+    def _decode(self, token: str) -> Dict[str, Any]:
         try:
             payload = jwt.decode(token, self.secret_key, algorithms=["HS256"])
             return payload
@@ -0,0 +1,157 @@
+import gzip
+from collections import OrderedDict
+from typing import Optional, Callable, Awaitable, Tuple
+from fastapi import Request, Response
+import brotli
+
+
+# Bodies smaller than this are not worth the compression overhead
+MIN_COMPRESS_BYTES = 1024
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick the best content coding the client accepts: br, then gzip, else identity"""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip()] = quality
+    if accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """True if If-None-Match names exactly this representation (weak comparison, per RFC 9110)"""
+    if etag.startswith("W/"):
+        etag = etag[2:]
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        # Projections are distinct representations, so the whole tag must match
+        if tag == etag:
+            return True
+    return False
+
+
+class EncodedBodyCache:
+    """Small LRU of serialized and encoded bodies keyed by (content hash, variant, encoding)"""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_lengths: int = 65536):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries: "OrderedDict[Tuple[str, str, Optional[str]], bytes]" = OrderedDict()
+        # Identity body lengths outlive evicted bodies so a cached encoded body is found without the identity one
+        self.max_lengths = max_lengths
+        self.lengths: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
+
+    def length(self, content_hash: str, variant: str) -> Optional[int]:
+        """Length of the unencoded body of a representation, if it was rendered before"""
+        length = self.lengths.get((content_hash, variant))
+        if length is not None:
+            self.lengths.move_to_end((content_hash, variant))
+        return length
+
+    def get(self, key: Tuple[str, str, Optional[str]]) -> Optional[bytes]:
+        body = self.entries.get(key)
+        if body is not None:
+            self.entries.move_to_end(key)
+        return body
+
+    def put(self, key: Tuple[str, str, Optional[str]], body: bytes) -> None:
+        if key[2] is None:
+            self.lengths[key[:2]] = len(body)
+            self.lengths.move_to_end(key[:2])
+            while len(self.lengths) > self.max_lengths:
+                self.lengths.popitem(last=False)
+        if len(body) > self.max_bytes // 4:
+            return
+        previous = self.entries.pop(key, None)
+        if previous is not None:
+            self.size -= len(previous)
+        self.entries[key] = body
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+
+
+def served_encoding(negotiated: Optional[str], length: int) -> Optional[str]:
+    """The coding actually applied to a body: small ones are sent as identity whatever was negotiated"""
+    return negotiated if negotiated and length >= MIN_COMPRESS_BYTES else None
+
+
+def encode_body(body: bytes, encoding: Optional[str]) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+
+body_cache = EncodedBodyCache()
+
+
+def make_etag(content_hash: str, variant: str) -> str:
+    """Weak tag from the stored content hash alone; the gzip, br and identity bodies are weakly equivalent"""
+    # Leaving the coding out lets any worker answer If-None-Match without rendering the body
+    tag = f"{content_hash}.{variant}" if variant else content_hash
+    return f'W/"{tag}"'
+
+
+async def encoded_body(content_hash: str, variant: str, negotiated: Optional[str],
+                       render: Callable[[], Awaitable[Optional[bytes]]]) -> Optional[Tuple[bytes, Optional[str]]]:
+    """The body to send and the coding applied to it, rendering only on a cache miss"""
+    length = body_cache.length(content_hash, variant)
+    if length is not None:
+        encoding = served_encoding(negotiated, length)
+        body = body_cache.get((content_hash, variant, encoding))
+        if body is not None:
+            return body, encoding
+
+    body = body_cache.get((content_hash, variant, None))
+    if body is None:
+        body = await render()
+        if body is None:
+            return None
+        body_cache.put((content_hash, variant, None), body)
+    encoding = served_encoding(negotiated, len(body))
+    if encoding:
+        body = encode_body(body, encoding)
+        body_cache.put((content_hash, variant, encoding), body)
+    return body, encoding
+
+
+async def conditional_json_response(request: Request, content_hash: str,
+                                    render: Callable[[], Awaitable[Optional[bytes]]],
+                                    variant: str = "") -> Optional[Response]:
+    """
+    Serve a JSON body with an ETag derived from content_hash; variant distinguishes
+    projections of the same content. Returns 304 without calling render when the client
+    already holds it, and None when render finds nothing.
+    """
+    negotiated = negotiate_encoding(request.headers.get("accept-encoding", ""))
+    etag = make_etag(content_hash, variant)
+    headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    result = await encoded_body(content_hash, variant, negotiated, render)
+    if result is None:
+        return None
+    body, encoding = result
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -1,39 +1,116 @@
+import asyncio
 import base64
-import os
-from typing import Optional
-from cryptography.fernet import Fernet
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional, Dict, Any, List
+from cryptography.fernet import Fernet, MultiFernet
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 
 from config import settings
 
 
+@lru_cache(maxsize=16)
+def derive_fernet_key(encryption_key: str) -> bytes:
+    """Derive a 32-byte Fernet key from a secret; cached because PBKDF2 is deliberately slow"""
+    kdf = PBKDF2HMAC(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=b"context_crystal_salt",  # In production, use a random salt per key
+        iterations=100000,
+    )
+    return base64.urlsafe_b64encode(kdf.derive(encryption_key.encode()))
+
+
+def parse_key_versions(current_key: str, current_version: int, previous_keys: str) -> Dict[int, str]:
+    """Map key versions to secrets; previous keys are given as "version:secret" pairs separated by commas"""
+    keys: Dict[int, str] = {}
+    for entry in filter(None, (part.strip() for part in previous_keys.split(","))):
+        version, sep, secret = entry.partition(":")
+        if not sep or not version.strip().isdigit():
+            raise ValueError("Previous encryption keys must be formatted as version:secret")
+        keys[int(version)] = secret
+    keys[current_version] = current_key
+    return keys
+
+
 class EncryptionService:
-    def __init__(self):
-        self.fernet = self._create_fernet(settings.encryption_key)
-    
-    def _create_fernet(self, encryption_key: str) -> Fernet:
-        """Create Fernet instance from encryption key"""
-        # Derive a 32-byte key from the provided encryption key
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=b"context_crystal_salt",  # In production, use a random salt per key
-            iterations=100000,
-        )
-        key = base64.urlsafe_b64encode(kdf.derive(encryption_key.encode()))
-        return Fernet(key)
-    
+    def __init__(self, key_versions: Optional[Dict[int, str]] = None, current_version: Optional[int] = None,
+                 rotation_workers: int = 4):
+        if key_versions is None:
+            current_version = settings.encryption_key_version
+            key_versions = parse_key_versions(
+                settings.encryption_key, current_version, settings.encryption_previous_keys
+            )
+        self.key_versions = key_versions
+        self.current_version = current_version if current_version is not None else max(key_versions)
+        self.rotation_workers = rotation_workers
+        # Keys are derived on first use rather than at import so workers start without PBKDF2 cost
+        self._fernets: Dict[int, Fernet] = {}
+        self._multi_fernet: Optional[MultiFernet] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def fernet(self, version: Optional[int] = None) -> Fernet:
+        """Fernet for a key version, the current one by default"""
+        version = self.current_version if version is None else version
+        fernet = self._fernets.get(version)
+        if fernet is None:
+            if version not in self.key_versions:
+                raise ValueError(f"Unknown encryption key version: {version}")
+            fernet = self._fernets[version] = Fernet(derive_fernet_key(self.key_versions[version]))
+        return fernet
+
+    @property
+    def multi_fernet(self) -> MultiFernet:
+        """All key versions, newest first; only needed for tokens of unknown version"""
+        if self._multi_fernet is None:
+            versions = sorted(self.key_versions, reverse=True)
+            versions.remove(self.current_version)
+            self._multi_fernet = MultiFernet([self.fernet(v) for v in [self.current_version, *versions]])
+        return self._multi_fernet
+
     def encrypt_api_key(self, api_key: str) -> str:
-        """Encrypt an API key for storage"""
-        encrypted_key = self.fernet.encrypt(api_key.encode())
+        """Encrypt an API key for storage with the current key version"""
+        encrypted_key = self.fernet().encrypt(api_key.encode())
         return encrypted_key.decode()
-    
-    def decrypt_api_key(self, encrypted_key: str) -> str:
-        """Decrypt an API key for use"""
-        decrypted_key = self.fernet.decrypt(encrypted_key.encode())
+
+    def decrypt_api_key(self, encrypted_key: str, key_version: Optional[int] = None) -> str:
+        """Decrypt an API key for use, directly with its stored key version when known"""
+        if key_version is not None and key_version in self.key_versions:
+            decrypted_key = self.fernet(key_version).decrypt(encrypted_key.encode())
+        else:
+            decrypted_key = self.multi_fernet.decrypt(encrypted_key.encode())
         return decrypted_key.decode()
 
+    def reencrypt_api_key(self, encrypted_key: str, key_version: Optional[int] = None) -> str:
+        """Re-encrypt a stored API key under the current key version"""
+        return self.encrypt_api_key(self.decrypt_api_key(encrypted_key, key_version))
+
+    def _reencrypt_batch(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [
+            {**row, "encrypted_key": self.reencrypt_api_key(row["encrypted_key"], row.get("key_version")),
+             "key_version": self.current_version}
+            for row in rows
+        ]
+
+    async def rotate_api_keys(self, rows: List[Dict[str, Any]], batch_size: int = 50) -> List[Dict[str, Any]]:
+        """Re-encrypt stored key rows not yet on the current version, in batches on a thread pool"""
+        stale = [row for row in rows if row.get("key_version") != self.current_version]
+        if not stale:
+            return []
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.rotation_workers, thread_name_prefix="key-rotation")
+        # Derive every key up front so worker threads never race to run PBKDF2
+        for version in {row.get("key_version") for row in stale} | {self.current_version}:
+            if version in self.key_versions:
+                self.fernet(version)
+        loop = asyncio.get_running_loop()
+        batches = [stale[i:i + batch_size] for i in range(0, len(stale), batch_size)]
+        results = await asyncio.gather(*(
+            loop.run_in_executor(self._executor, self._reencrypt_batch, batch) for batch in batches
+        ))
+        return [row for batch in results for row in batch]
+
 
 # Global encryption service instance
-encryption_service = EncryptionService()
\ No newline at end of file
+encryption_service = EncryptionService()
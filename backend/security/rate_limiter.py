@@ -1,35 +1,134 @@
+import sqlite3
+import threading
 import time
-from typing import Dict, Tuple
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import List
 from fastapi import HTTPException, Request
 from starlette.status import HTTP_429_TOO_MANY_REQUESTS
 
+from config import settings
+
+
+class RateLimitBackend(ABC):
+    """Storage for token buckets; acquire must refill and take a token atomically"""
+
+    @abstractmethod
+    def acquire(self, key: str, capacity: float, refill_per_second: float, now: float) -> bool:
+        """Take one token from the key's bucket; False when it is empty"""
+
+    @abstractmethod
+    def evict_idle(self, idle_before: float) -> int:
+        """Drop buckets untouched since idle_before; returns how many were removed"""
+
+
+class MemoryBackend(RateLimitBackend):
+    """Per-process buckets kept in least-recently-used order so idle keys are evicted from the front"""
+
+    def __init__(self):
+        self.buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+
+    def acquire(self, key: str, capacity: float, refill_per_second: float, now: float) -> bool:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = [capacity, now]
+        else:
+            self.buckets.move_to_end(key)
+            bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * refill_per_second)
+            bucket[1] = now
+        if bucket[0] < 1:
+            return False
+        bucket[0] -= 1
+        return True
+
+    def evict_idle(self, idle_before: float) -> int:
+        removed = 0
+        while self.buckets:
+            key, bucket = next(iter(self.buckets.items()))
+            if bucket[1] >= idle_before:
+                break
+            del self.buckets[key]
+            removed += 1
+        return removed
+
+
+class SQLiteBackend(RateLimitBackend):
+    """Buckets shared by every worker process through one SQLite file"""
+
+    def __init__(self, db_path: str = "rate_limits.db"):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_rate_limit_buckets_updated ON rate_limit_buckets(updated_at)"
+        )
+
+    def acquire(self, key: str, capacity: float, refill_per_second: float, now: float) -> bool:
+        # Refill and take in one statement; the WHERE clause leaves the row untouched when empty
+        with self._lock:
+            row = self._conn.execute(
+                """INSERT INTO rate_limit_buckets (key, tokens, updated_at) VALUES (?, ? - 1, ?)
+                   ON CONFLICT(key) DO UPDATE SET
+                       tokens = MIN(?, tokens + (excluded.updated_at - updated_at) * ?) - 1,
+                       updated_at = excluded.updated_at
+                   WHERE MIN(?, tokens + (excluded.updated_at - updated_at) * ?) >= 1
+                   RETURNING tokens""",
+                (key, capacity, now, capacity, refill_per_second, capacity, refill_per_second)
+            ).fetchone()
+        return row is not None
+
+    def evict_idle(self, idle_before: float) -> int:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM rate_limit_buckets WHERE updated_at < ?", (idle_before,))
+        return cursor.rowcount
+
 
 class RateLimiter:
-    def __init__(self, requests_per_minute: int = 60):
+    """Token bucket limiter: constant time and memory per user, idle buckets evicted"""
+
+    def __init__(self, requests_per_minute: int = 60, backend: RateLimitBackend = None,
+                 eviction_interval: float = 60.0):
         self.requests_per_minute = requests_per_minute
-        self.requests: Dict[str, list] = {}
-    
+        self.capacity = float(requests_per_minute)
+        self.refill_per_second = requests_per_minute / 60.0
+        self.backend = backend or MemoryBackend()
+        self.eviction_interval = eviction_interval
+        # A bucket idle this long has refilled completely, so forgetting it changes nothing
+        self.idle_seconds = self.capacity / self.refill_per_second
+        self._next_eviction = time.time() + eviction_interval
+
     def is_rate_limited(self, user_id: str) -> bool:
-        """Check if user has exceeded rate limit"""
+        """Check if user has exceeded rate limit, consuming a token when they have not"""
         now = time.time()
-        if user_id not in self.requests:
-            self.requests[user_id] = []
-        
-        # Remove requests older than 1 minute
-        self.requests[user_id] = [req_time for req_time in self.requests[user_id] 
-                                if now - req_time < 60]
-        
-        # Check if limit exceeded
-        if len(self.requests[user_id]) >= self.requests_per_minute:
-            return True
-        
-        # Add current request
-        self.requests[user_id].append(now)
-        return False
+        if now >= self._next_eviction:
+            self._next_eviction = now + self.eviction_interval
+            self.backend.evict_idle(now - self.idle_seconds)
+        return not self.backend.acquire(user_id, self.capacity, self.refill_per_second, now)
+
+
+def create_backend(name: str) -> RateLimitBackend:
+    """Build the configured rate limit backend"""
+    if name == "sqlite":
+        return SQLiteBackend(settings.rate_limit_db_path)
+    if name == "memory":
+        return MemoryBackend()
+    raise ValueError(f"Unknown rate limit backend: {name}")
 
 
 # Global rate limiter instance
-rate_limiter = RateLimiter(requests_per_minute=60)
+rate_limiter = RateLimiter(
+    requests_per_minute=settings.rate_limit_per_minute,
+    backend=create_backend(settings.rate_limit_backend)
+)
 
 
 async def check_rate_limit(request: Request, user_id: str):
@@ -38,4 +137,4 @@ async def check_rate_limit(request: Request, user_id: str):
         raise HTTPException(
             status_code=HTTP_429_TOO_MANY_REQUESTS,
             detail="Rate limit exceeded. Please try again in a minute."
-        )
\ No newline at end of file
+        )
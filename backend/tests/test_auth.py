@@ -0,0 +1,59 @@
+import jwt
+import pytest
+from fastapi import HTTPException
+
+from routes import auth
+from routes.auth import JWTValidator
+
+
+SECRET = "test-secret"
+
+
+class Clock:
+    def __init__(self, now: float = 1_700_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(auth.time, "time", clock)
+    return clock
+
+
+def make_validator() -> JWTValidator:
+    validator = JWTValidator()
+    validator.secret_key = SECRET
+    return validator
+
+
+def test_revoked_token_without_exp_stays_revoked(clock):
+    validator = make_validator()
+    token = jwt.encode({"sub": "u1"}, SECRET, algorithm="HS256")
+    assert validator.validate_token(token)["sub"] == "u1"
+
+    validator.revoke_token(token)
+    # Well past the cache TTL and any sweep: a token that never expires must stay revoked
+    clock.now += validator.cache.max_ttl + 1
+    validator.cache.put(b"other", {"sub": "u2"}, clock.now)
+    with pytest.raises(HTTPException) as raised:
+        validator.validate_token(token)
+    assert raised.value.detail == "Token has been revoked"
+
+
+def test_revocation_lapses_with_exp_and_is_swept(clock):
+    validator = make_validator()
+    token = jwt.encode({"sub": "u1", "exp": int(clock.now) + 60}, SECRET, algorithm="HS256")
+    validator.revoke_token(token)
+    with pytest.raises(HTTPException):
+        validator.validate_token(token)
+
+    clock.now += 61
+    validator.cache.put(b"other", {"sub": "u2"}, clock.now)
+    assert validator.cache.revoked == {}
+    with pytest.raises(HTTPException) as raised:
+        validator.validate_token(token)
+    assert raised.value.detail == "Token has expired"
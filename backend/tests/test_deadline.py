@@ -0,0 +1,36 @@
+import asyncio
+import time
+
+from db.sqlite import DatabaseManager
+from models.schemas import CompressionRequest
+from pipeline.deadline import Deadline, StageCostModel
+
+
+def test_queue_time_counts_against_the_deadline():
+    deadline = Deadline(2000, StageCostModel(), enqueued_at=time.time() - 1.5)
+    assert deadline.remaining() <= 0.5
+    assert deadline.summary()["queued_ms"] >= 1500
+
+
+def test_budget_spent_in_the_queue_degrades_every_stage():
+    deadline = Deadline(2000, StageCostModel(), enqueued_at=time.time() - 5)
+    assert deadline.remaining() == 0
+    for stage in ("preprocessing", "compression", "verification"):
+        assert deadline.headroom(stage, 1000) < 1.0
+    assert deadline.summary()["deadline_met"] is False
+
+
+def test_claimed_job_carries_its_enqueue_time(tmp_path):
+    db_manager = DatabaseManager(str(tmp_path / "jobs.db"))
+
+    async def scenario():
+        before = time.time()
+        await db_manager.enqueue_jobs([
+            {"id": "job", "conversation_id": "c", "request": CompressionRequest(deadline_ms=2000)}
+        ])
+        await asyncio.sleep(0.05)
+        return before, await db_manager.claim_job("worker")
+
+    before, job = asyncio.run(scenario())
+    assert before <= job["created_at"] <= before + 0.05
+    assert job["request"].deadline_ms == 2000
@@ -0,0 +1,104 @@
+import random
+from typing import List, Optional
+
+from models.schemas import CompressionRequest, Conversation, ConversationSource, Message, MessageRole
+from pipeline import dedup
+from pipeline.dedup import NearDuplicateFilter
+
+
+VOCAB = ("the a to of connection pool database request handler timeout retry cache worker queue "
+         "index query migration deploy container memory leak thread lock server client token "
+         "session error log config build test").split()
+
+TRACEBACK = """Traceback (most recent call last):
+  File "/app/main.py", line 42, in handler
+    result = process(event["id"])
+  File "/app/worker.py", line 118, in process
+    rows = db.fetch(query, params)
+  File "/usr/lib/python3.11/site-packages/db/client.py", line 77, in fetch
+    raise ConnectionError("connection refused")
+ConnectionError: connection refused"""
+
+
+def conversation(texts: List[str], roles: Optional[List[MessageRole]] = None) -> Conversation:
+    roles = roles or [MessageRole.USER] * len(texts)
+    return Conversation(id="c", source=ConversationSource.CHATGPT,
+                        messages=[Message(role=role, content=text) for role, text in zip(roles, texts)])
+
+
+def random_message(rng: random.Random, words: int) -> str:
+    # Shared technical vocabulary plus rarer words, so unrelated messages still overlap a lot
+    return " ".join(rng.choice(VOCAB) if rng.random() < 0.5 else f"w{rng.randrange(5000)}"
+                    for _ in range(words))
+
+
+def dropped_indexes(texts: List[str], threshold: float, **kwargs) -> List[int]:
+    _, dropped = NearDuplicateFilter(**kwargs).deduplicate(conversation(texts), threshold)
+    return [d["index"] for d in dropped]
+
+
+def test_off_by_default():
+    assert CompressionRequest().deduplicate_messages is False
+
+
+def test_one_word_edits_are_found_at_default_threshold():
+    rng = random.Random(7)
+    threshold = CompressionRequest().near_duplicate_threshold
+    found = 0
+    trials = 200
+    for _ in range(trials):
+        texts = [random_message(rng, rng.randint(20, 40)) for _ in range(30)]
+        words = rng.choice(texts).split()
+        words[rng.randrange(len(words))] = "changed"
+        texts.append(" ".join(words))
+        found += dropped_indexes(texts, threshold) == [30]
+    assert found / trials >= 0.98
+
+
+def test_retries_and_copied_logs_are_found():
+    texts = [
+        "Can you rewrite this function to use async/await instead of callbacks and keep the error handling",
+        TRACEBACK,
+        "How do I fix the memory leak in my Flask app? It grows about 50 MB per hour under load.",
+        "Can you please rewrite this function to use async/await instead of callbacks, keeping the error handling",
+        TRACEBACK.replace("line 118", "line 121"),
+        "How can I fix a memory leak in my Flask application? It grows around 50 MB every hour under load.",
+    ]
+    # The copied log differs in one line number; the retry adds a word and rewords one
+    assert dropped_indexes(texts, 0.9) == [4]
+    assert dropped_indexes(texts, 0.85) == [3, 4]
+    # A reworded prompt needs the loosest threshold the request schema allows
+    assert dropped_indexes(texts, 0.7) == [3, 4, 5]
+
+
+def test_unrelated_messages_are_kept_at_lowest_threshold():
+    rng = random.Random(11)
+    texts = [random_message(rng, 30) for _ in range(500)]
+    assert dropped_indexes(texts, 0.7) == []
+
+
+def test_duplicates_across_roles_are_kept():
+    text = "Make sure the environment variables are set correctly before you start the server"
+    filtered, dropped = NearDuplicateFilter().deduplicate(
+        conversation([text, text], [MessageRole.USER, MessageRole.ASSISTANT]), 0.9
+    )
+    assert dropped == []
+    assert len(filtered.messages) == 2
+
+
+def test_exact_comparisons_are_bounded_at_low_thresholds(monkeypatch):
+    calls = 0
+    cosine = dedup._cosine
+
+    def counting(a, b):
+        nonlocal calls
+        calls += 1
+        return cosine(a, b)
+
+    monkeypatch.setattr(dedup, "_cosine", counting)
+    rng = random.Random(3)
+    # Short messages over a tiny vocabulary crowd every bucket
+    texts = [" ".join(rng.choice(VOCAB[:12]) for _ in range(10)) for _ in range(2000)]
+    duplicate_filter = NearDuplicateFilter()
+    duplicate_filter.deduplicate(conversation(texts), 0.7)
+    assert calls <= duplicate_filter.max_verified * len(texts)
@@ -0,0 +1,69 @@
+import json
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from routes import http_cache
+from routes.http_cache import EncodedBodyCache, conditional_json_response
+
+
+CONTENT_HASH = "abc123"
+LARGE = json.dumps({"messages": ["x" * 40] * 200}).encode("utf-8")
+SMALL = b'{"id": "c"}'
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # A fresh cache per test stands in for a freshly started worker
+    monkeypatch.setattr(http_cache, "body_cache", EncodedBodyCache())
+    app = FastAPI()
+    app.state.renders = 0
+
+    @app.get("/{size}")
+    async def endpoint(size: str, request: Request, variant: str = ""):
+        async def render():
+            app.state.renders += 1
+            return LARGE if size == "large" else SMALL
+        return await conditional_json_response(request, f"{CONTENT_HASH}{size}", render, variant)
+
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("accept", ["br", "gzip", "identity"])
+def test_cold_cache_revalidates_without_rendering(client, accept):
+    etag = client.get("/large", headers={"Accept-Encoding": accept}).headers["etag"]
+    http_cache.body_cache = EncodedBodyCache()
+    client.app.state.renders = 0
+
+    response = client.get("/large", headers={"Accept-Encoding": accept, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert client.app.state.renders == 0
+
+
+def test_one_tag_for_every_coding(client):
+    responses = {accept: client.get("/large", headers={"Accept-Encoding": accept})
+                 for accept in ("br", "gzip", "identity")}
+    assert responses["br"].headers["content-encoding"] == "br"
+    assert responses["gzip"].headers["content-encoding"] == "gzip"
+    assert "content-encoding" not in responses["identity"].headers
+    assert {r.content for r in responses.values()} == {LARGE}
+    assert len({r.headers["etag"] for r in responses.values()}) == 1
+    assert client.app.state.renders == 1
+
+    # Too small to encode, yet tagged the same way
+    small = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+    assert small.headers["etag"] == f'W/"{CONTENT_HASH}small"'
+
+
+def test_projection_tags_do_not_cross_match(client):
+    full = client.get("/large").headers["etag"]
+    projected = client.get("/large", params={"variant": "v1"})
+    assert projected.headers["etag"] != full
+    response = client.get("/large", params={"variant": "v1"}, headers={"If-None-Match": full})
+    assert response.status_code == 200
+    response = client.get("/large", params={"variant": "v1"},
+                          headers={"If-None-Match": f'"other", {projected.headers["etag"]}'})
+    assert response.status_code == 304
@@ -0,0 +1,49 @@
+import asyncio
+import sqlite3
+
+from db.sqlite import DatabaseManager
+from models.schemas import (CompressionResult, Conversation, ConversationSource, Message, MessageRole,
+                            PromptOutput, VerificationResult)
+
+
+def results(tokens: int):
+    compressed = CompressionResult(compressed_content="summary", original_token_count=tokens,
+                                   compressed_token_count=tokens // 4, compression_ratio=0.75,
+                                   extracted_facts=[], processing_time=0.1)
+    verification = VerificationResult(verified_content="summary", total_claims=0, verified_claims=0,
+                                      grounding_score=0.9, corrections=[], failed_verifications=[])
+    prompt = PromptOutput(final_prompt="prompt", structure_breakdown={}, estimated_tokens=tokens // 5,
+                          quality_metrics={}, cost_estimation={"savings": 0.5})
+    return compressed, verification, prompt
+
+
+def save(db_manager: DatabaseManager, pipeline_id: str, tokens: int) -> None:
+    asyncio.run(db_manager.save_pipeline_result(pipeline_id, "c1", *results(tokens),
+                                                extra_metrics={"target_model": "gpt-4o"}))
+
+
+def totals(db_manager: DatabaseManager):
+    rows = asyncio.run(db_manager.get_pipeline_analytics(group_by="source"))
+    return [(row["source"], row["runs"], row["original_tokens"], row["prompt_tokens"], row["cost_savings"])
+            for row in rows]
+
+
+def test_existing_results_are_backfilled_once(tmp_path):
+    path = str(tmp_path / "conversations.db")
+    db_manager = DatabaseManager(path)
+    asyncio.run(db_manager.save_conversation(Conversation(
+        id="c1", source=ConversationSource.CHATGPT, messages=[Message(role=MessageRole.USER, content="hi")]
+    )))
+    save(db_manager, "p1", 1000)
+    save(db_manager, "p2", 3000)
+    # A database from before rollups: results saved, no rollup table
+    with sqlite3.connect(path) as conn:
+        conn.execute("DROP TABLE pipeline_rollups")
+
+    db_manager = DatabaseManager(path)
+    assert totals(db_manager) == [("chatgpt", 2, 4000, 800, 1.0)]
+
+    # Later starts find the table and leave it alone; new results are folded in incrementally
+    db_manager = DatabaseManager(path)
+    save(db_manager, "p3", 500)
+    assert totals(db_manager) == [("chatgpt", 3, 4500, 900, 1.5)]
@@ -0,0 +1,225 @@
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+import pytest
+
+from database.supabase_client import SupabaseManager
+
+
+class PostgRESTStub:
+    """In-memory PostgREST subset: eq filters, upsert via on_conflict, return=representation"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.tables: Dict[str, List[Dict[str, Any]]] = {"user_api_keys": [], "security_audit": []}
+        self.requests: List[httpx.Request] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.next_id = 1
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            return self.handle(request)
+        finally:
+            self.in_flight -= 1
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        table = self.tables[request.url.path.rsplit("/", 1)[-1]]
+        filters = {key: value[3:] for key, value in request.url.params.items() if value.startswith("eq.")}
+        matches = [row for row in table if all(str(row.get(k)) == v for k, v in filters.items())]
+        representation = "return=representation" in request.headers.get("prefer", "")
+
+        if request.method == "GET":
+            return httpx.Response(200, json=matches)
+        if request.method == "DELETE":
+            for row in matches:
+                table.remove(row)
+            return httpx.Response(200, json=matches) if representation else httpx.Response(204)
+
+        payload = json.loads(request.content)
+        rows = payload if isinstance(payload, list) else [payload]
+        conflict = request.url.params.get("on_conflict", "").split(",")
+        written = []
+        for row in rows:
+            existing = next((r for r in table if conflict != [""] and all(r[c] == row[c] for c in conflict)), None)
+            if existing is None:
+                existing = {"id": self.next_id}
+                self.next_id += 1
+                table.append(existing)
+            existing.update(row)
+            written.append(dict(existing))
+        return httpx.Response(201, json=written) if representation else httpx.Response(201)
+
+
+def make_manager(handler, **kwargs) -> SupabaseManager:
+    return SupabaseManager(url="http://stub.local", key="service-key",
+                           transport=httpx.MockTransport(handler), **kwargs)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_select_filters_by_user_and_service():
+    stub = PostgRESTStub()
+    stub.tables["user_api_keys"] = [
+        {"id": 1, "user_id": "u1", "service_name": "openai", "encrypted_key": "a", "key_version": 1},
+        {"id": 2, "user_id": "u1", "service_name": "anthropic", "encrypted_key": "b", "key_version": 1},
+        {"id": 3, "user_id": "u2", "service_name": "openai", "encrypted_key": "c", "key_version": 1},
+    ]
+    manager = make_manager(stub)
+
+    async def scenario():
+        keys = await manager.get_user_api_keys("u1")
+        one = await manager.get_api_key("u2", "openai")
+        missing = await manager.get_api_key("u2", "anthropic")
+        await manager.close()
+        return keys, one, missing
+
+    keys, one, missing = run(scenario())
+    assert sorted(row["id"] for row in keys) == [1, 2]
+    assert one["encrypted_key"] == "c"
+    assert missing is None
+    request = stub.requests[0]
+    assert request.url.path == "/rest/v1/user_api_keys"
+    assert request.headers["apikey"] == "service-key"
+    assert request.headers["authorization"] == "Bearer service-key"
+
+
+def test_upsert_merges_on_conflict():
+    stub = PostgRESTStub()
+    manager = make_manager(stub)
+
+    async def scenario():
+        first = await manager.upsert_api_key("u1", "openai", "old", 1)
+        second = await manager.upsert_api_key("u1", "openai", "new", 2)
+        await manager.close()
+        return first, second
+
+    first, second = run(scenario())
+    assert first["id"] == second["id"]
+    assert second["encrypted_key"] == "new" and second["key_version"] == 2
+    assert len(stub.tables["user_api_keys"]) == 1
+    assert stub.requests[0].url.params["on_conflict"] == "user_id,service_name"
+    assert "resolution=merge-duplicates" in stub.requests[0].headers["prefer"]
+
+
+def test_bulk_upsert_is_one_request():
+    stub = PostgRESTStub()
+    manager = make_manager(stub)
+    rows = [
+        {"user_id": "u1", "service_name": f"service-{i}", "encrypted_key": f"k{i}", "key_version": 2, "id": 99}
+        for i in range(25)
+    ]
+
+    async def scenario():
+        written = await manager.bulk_upsert_api_keys(rows)
+        empty = await manager.bulk_upsert_api_keys([])
+        await manager.close()
+        return written, empty
+
+    written, empty = run(scenario())
+    assert len(written) == 25
+    assert empty == []
+    assert len(stub.requests) == 1
+    # Only the upsertable columns are sent, never ids or timestamps from the read
+    assert all(set(row) == {"user_id", "service_name", "encrypted_key", "key_version"}
+               for row in json.loads(stub.requests[0].content))
+
+
+def test_delete_reports_whether_a_row_was_removed():
+    stub = PostgRESTStub()
+    stub.tables["user_api_keys"] = [{"id": 1, "user_id": "u1", "service_name": "openai"}]
+    manager = make_manager(stub)
+
+    async def scenario():
+        removed = await manager.delete_api_key("u1", "openai")
+        again = await manager.delete_api_key("u1", "openai")
+        await manager.close()
+        return removed, again
+
+    assert run(scenario()) == (True, False)
+    assert stub.tables["user_api_keys"] == []
+
+
+def test_per_call_timeout_overrides_default():
+    stub = PostgRESTStub()
+    manager = make_manager(stub, timeout=5.0)
+
+    async def scenario():
+        await manager.get_user_api_keys("u1")
+        await manager.get_user_api_keys("u1", timeout=0.25)
+        await manager.close()
+
+    run(scenario())
+    assert stub.requests[0].extensions["timeout"]["read"] == 5.0
+    assert stub.requests[1].extensions["timeout"]["read"] == 0.25
+
+
+def test_timeouts_and_http_errors_are_wrapped():
+    async def timing_out(request: httpx.Request) -> httpx.Response:
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    async def failing(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(503, json={"message": "unavailable"})
+
+    async def scenario():
+        manager = make_manager(timing_out)
+        with pytest.raises(Exception, match="Failed to fetch user API keys"):
+            await manager.get_user_api_keys("u1", timeout=0.01)
+        await manager.close()
+
+        manager = make_manager(failing)
+        with pytest.raises(Exception, match="Failed to upsert API key"):
+            await manager.upsert_api_key("u1", "openai", "k")
+        # Batched audit inserts raise so the writer can spill; single audit logs never raise
+        with pytest.raises(httpx.HTTPStatusError):
+            await manager.insert_security_audits([{"user_id": "u1", "action": "x"}])
+        await manager.log_security_audit("u1", "x")
+        await manager.close()
+
+    run(scenario())
+
+
+def test_concurrent_calls_share_the_pool_without_serializing():
+    stub = PostgRESTStub(latency=0.2)
+    manager = make_manager(stub, max_connections=20)
+
+    async def scenario():
+        client = manager.client
+        start = time.perf_counter()
+        results = await asyncio.gather(*(manager.get_user_api_keys(f"u{i}") for i in range(20)))
+        elapsed = time.perf_counter() - start
+        same_client = manager.client is client
+        await manager.close()
+        return results, elapsed, same_client
+
+    results, elapsed, same_client = run(scenario())
+    assert len(results) == 20
+    assert same_client
+    assert stub.max_in_flight == 20
+    # Twenty 200 ms round trips overlap instead of taking four seconds back to back
+    assert elapsed < 1.0
+
+
+def test_close_recreates_the_client_on_next_use():
+    stub = PostgRESTStub()
+    manager = make_manager(stub)
+
+    async def scenario() -> Optional[bool]:
+        first = manager.client
+        await manager.close()
+        await manager.get_user_api_keys("u1")
+        recreated = manager.client is not first
+        await manager.close()
+        return recreated
+
+    assert run(scenario())
@@ -0,0 +1,55 @@
+import asyncio
+import sqlite3
+from typing import Dict
+
+from db.vector_index import VectorIndex
+from models.schemas import Conversation, ConversationSource, Message, MessageRole
+
+
+def conversation(conversation_id: str, text: str) -> Conversation:
+    return Conversation(id=conversation_id, source=ConversationSource.CHATGPT,
+                        messages=[Message(role=MessageRole.USER, content=text)])
+
+
+DOCS = {
+    "a": "How do I tune the connection pool of the database under load",
+    "b": "The docker build fails when the cache layer is invalidated",
+    "c": "Tune the database connection pool and add an index on the foreign key",
+}
+
+
+def document_frequency(index: VectorIndex) -> Dict[int, int]:
+    with sqlite3.connect(index.db_path) as conn:
+        return dict(conn.execute("SELECT bucket, df FROM vector_document_frequency"))
+
+
+def build(path, docs: Dict[str, str]) -> VectorIndex:
+    index = VectorIndex(str(path), dim=256)
+    asyncio.run(index.add([conversation(cid, text) for cid, text in docs.items()]))
+    return index
+
+
+def test_remove_gives_back_document_frequency(tmp_path):
+    index = build(tmp_path / "all.db", DOCS)
+    asyncio.run(index.remove("c"))
+    expected = build(tmp_path / "expected.db", {"a": DOCS["a"], "b": DOCS["b"]})
+    assert document_frequency(index) == document_frequency(expected)
+
+    assert "c" not in [r["conversation_id"] for r in asyncio.run(index.related("a"))]
+    assert asyncio.run(index.related("c")) is None
+
+
+def test_readding_replaces_the_old_terms(tmp_path):
+    index = build(tmp_path / "all.db", DOCS)
+    changed = "Kubernetes pods restart whenever the liveness probe times out"
+    asyncio.run(index.add([conversation("b", changed)]))
+    expected = build(tmp_path / "expected.db", dict(DOCS, b=changed))
+    assert document_frequency(index) == document_frequency(expected)
+
+
+def test_remove_everything_empties_document_frequency(tmp_path):
+    index = build(tmp_path / "all.db", DOCS)
+    for cid in DOCS:
+        asyncio.run(index.remove(cid))
+    assert document_frequency(index) == {}
+    assert asyncio.run(index.search_text("database connection pool")) == []